@@ -0,0 +1,184 @@
+"""Admission control: per-lane concurrency, load shedding and body budgets
+
+Requests are classified into lanes. ``predict`` (single readings) and
+``batch`` (uploads, validation, dataset scans) each get their own thread
+pool, so an expensive upload never occupies a thread a prediction needs.
+When a lane already holds ``concurrency + queue`` requests, new ones are
+refused at once with 503 and a ``Retry-After`` estimated from the lane's
+recent service time, rather than being accepted and timing out later.
+Requests still queued after the lane's ``max_wait`` are dropped the same
+way before any work is done. Upload sizes are checked against the lane's
+limits from ``Content-Length`` before the body is read.
+
+Lanes need ``SERVER_MODE=async``: only the ASGI adapter holds several
+requests per worker, so only there can a lane queue, shed or keep
+predictions apart from uploads. A sync worker serves one request at a time
+and all workers share gunicorn's accept queue, so per-process counters
+would never pass 1 there. Under sync workers the Flask hook only enforces
+the per-lane body size limits, and gunicorn_config.py says so at startup.
+Streaming paths (``ASGI_STREAM_PATHS``) are read line by line with a
+bounded buffer, so they are exempt from lanes and size limits.
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MB = 1024 * 1024
+
+PREDICT_PATHS = ('/api/predict', '/api/stream/predict', '/api/extract-features')
+BATCH_PREFIXES = ('/api/validate', '/api/browse-dataset', '/api/psi', '/api/datasets', '/api/load-default-dataset')
+STREAM_PATHS = tuple(p for p in os.environ.get('ASGI_STREAM_PATHS', '/api/stream/ingest').split(',') if p)
+
+# Smoothing factor for the per-lane service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Rejection(Exception):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class Lane:
+    """Bounded pool plus queue accounting for one class of requests
+
+    Admission and release happen on the event loop, expiry and service times
+    on the lane's pool threads, so every update holds the lane's lock.
+    """
+
+    def __init__(self, name, concurrency, max_queue, max_wait, max_body_bytes, body_budget_bytes=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_body_bytes = max_body_bytes
+        self.body_budget_bytes = body_budget_bytes
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'lane-{name}')
+        self.pending = 0
+        self.pending_bytes = 0
+        self.service_time = 0.05
+        self.admitted = 0
+        self.completed = 0
+        self.shed = 0
+        self.expired = 0
+        self.too_large = 0
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        return max(1, math.ceil(self.pending * self.service_time / self.concurrency))
+
+    def check_size(self, content_length):
+        if content_length is not None and content_length > self.max_body_bytes:
+            with self._lock:
+                self.too_large += 1
+            raise Rejection(413, f'Request body exceeds {self.max_body_bytes // MB} MB for {self.name} requests')
+
+    def admit(self, content_length=None):
+        """Reserve a slot or raise :class:`Rejection`"""
+        self.check_size(content_length)
+        size = content_length or 0
+        with self._lock:
+            if self.pending >= self.concurrency + self.max_queue:
+                self.shed += 1
+                raise Rejection(503, f'Server busy ({self.name} queue full)', self.retry_after())
+            if self.body_budget_bytes is not None and self.pending and self.pending_bytes + size > self.body_budget_bytes:
+                self.shed += 1
+                raise Rejection(503, f'Server busy ({self.name} upload budget in use)', self.retry_after())
+            self.pending += 1
+            self.pending_bytes += size
+            self.admitted += 1
+
+    def release(self, content_length=None):
+        with self._lock:
+            self.pending -= 1
+            self.pending_bytes -= content_length or 0
+            self.completed += 1
+
+    def run(self, queued_at, fn, *args):
+        """Body of a pool task: drop it if it waited too long, else time it"""
+        started = time.monotonic()
+        if started - queued_at > self.max_wait:
+            with self._lock:
+                self.expired += 1
+            raise Rejection(503, f'Server busy ({self.name} request waited too long)', self.retry_after())
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    def stats(self):
+        return {
+            'concurrency': self.concurrency,
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait,
+            'max_body_bytes': self.max_body_bytes,
+            'body_budget_bytes': self.body_budget_bytes,
+            'pending': self.pending,
+            'pending_bytes': self.pending_bytes,
+            'service_time_ms': self.service_time * 1000,
+            'admitted': self.admitted,
+            'completed': self.completed,
+            'shed': self.shed,
+            'expired': self.expired,
+            'too_large': self.too_large,
+        }
+
+
+class AdmissionController:
+    def __init__(self, lanes):
+        self.lanes = {lane.name: lane for lane in lanes}
+        # Set by the ASGI adapter; sync workers only apply the body size limits
+        self.enforced = False
+
+    @classmethod
+    def from_env(cls, default_threads=4):
+        env = os.environ.get
+        return cls([
+            Lane('predict', int(env('PREDICT_CONCURRENCY', 4)), int(env('PREDICT_QUEUE', 64)),
+                 float(env('PREDICT_MAX_WAIT', 1.0)), int(float(env('PREDICT_MAX_BODY_MB', 1)) * MB)),
+            Lane('batch', int(env('BATCH_CONCURRENCY', 2)), int(env('BATCH_QUEUE', 8)),
+                 float(env('BATCH_MAX_WAIT', 20.0)), int(float(env('BATCH_MAX_BODY_MB', 100)) * MB),
+                 body_budget_bytes=int(float(env('BATCH_BODY_BUDGET_MB', 200)) * MB)),
+            Lane('default', default_threads, int(env('DEFAULT_QUEUE', 64)),
+                 float(env('DEFAULT_MAX_WAIT', 5.0)), int(float(env('DEFAULT_MAX_BODY_MB', 1)) * MB)),
+        ])
+
+    def is_stream(self, path):
+        return path in STREAM_PATHS
+
+    def lane_for(self, method, path):
+        if path in PREDICT_PATHS:
+            return self.lanes['predict']
+        if method != 'OPTIONS' and path.startswith(BATCH_PREFIXES):
+            return self.lanes['batch']
+        return self.lanes['default']
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def shutdown(self):
+        for lane in self.lanes.values():
+            lane.executor.shutdown(wait=False)
+
+
+_controller = None
+
+
+def get_controller(default_threads=4):
+    """Process-wide controller shared by the ASGI adapter and the Flask hooks"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController.from_env(default_threads)
+    return _controller
+
+
+def stats():
+    controller = get_controller()
+    return {'enforced': controller.enforced, 'lanes': controller.stats()}
@@ -1,14 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
 import tensorflow as tf
 from sklearn.preprocessing import MinMaxScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report, precision_score, recall_score, f1_score
 import joblib
 import os
-import io
+import hmac
+import json
+
+from monitoring import InputMonitor
+from streaming import StreamingPredictor, create_state_store, iter_ndjson
+from history import PredictionStore, to_epoch
+import psi
+from feature_selection import check_features, load_selected_features
+from extraction import EXTRACTED_COLUMNS, EXTRACTOR_PATH, FeatureExtractor
+from prediction_cache import create_cache
+from feature_selection import file_digest
+from serialization import RawJSON, compressed_response, dataset_json, frame_json, object_json, request_layout
+from dataset_sessions import DatasetNotFound, DatasetSessionStore
+import admission
+from metrics import confusion_matrix, evaluate, evaluate_matrix
+import memory_guard
+from cpu_planner import configure_tensorflow
+from model_bundle import MODEL_PATH, STUDENT_PATH, load_model_file, model_file
+from model_reload import ModelReloader
+from warmup import CompiledPredictor
+
+configure_tensorflow(tf)
 
 app = Flask(__name__, static_folder='static', static_url_path='')
 
@@ -20,27 +40,93 @@ cors = CORS(app, resources={
             "http://localhost:5000",
             "https://your-frontend-domain.com"  # Replace with your actual frontend domain
         ],
-        "methods": ["GET", "POST", "OPTIONS"],
+        "methods": ["GET", "POST", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
 
+# Model input features, taken from the latest feature selection artifact if present
+FEATURE_COLUMNS = load_selected_features()
+
 # Global variables for model and scaler
 model = None
 scaler = None
 label_encoder = None
+monitor = None
+streaming_predictor = None
+prediction_store = None
+feature_extractor = None
+prediction_cache = None
+model_version = None
+model_reloader = None
+# 'gru' serves MODEL_PATH; 'student' serves the distilled MLP at STUDENT_PATH (see distill.py)
+SERVING_MODEL = os.environ.get('SERVING_MODEL', 'gru')
+# 'gru', 'trained' (trained at startup), 'student' or 'mock'
+model_variant = None
+model_ready = False
+warmup_report = None
+dataset_sessions = None
+memory_tracker = memory_guard.MemoryTracker()
+
+@app.before_request
+def enforce_body_limits():
+    """Refuse oversized uploads from Content-Length before the body is parsed
+
+    Lanes, queues and shedding need the ASGI adapter (SERVER_MODE=async), which
+    admits requests before they reach Flask; a sync worker only has this check.
+    """
+    controller = admission.get_controller()
+    if controller.enforced or controller.is_stream(request.path):
+        return None
+    lane = controller.lane_for(request.method, request.path)
+    try:
+        lane.check_size(request.content_length)
+    except admission.Rejection as e:
+        return jsonify({'error': e.message}), e.status
+
+@app.before_request
+def start_memory_tracking():
+    g.memory = memory_tracker.start()
+
+@app.after_request
+def record_request_memory(response):
+    token = g.pop('memory', None)
+    if token is not None:
+        used = memory_tracker.finish(token, request.endpoint or request.path)
+        response.headers['X-Peak-Memory-MB'] = f'{used / memory_guard.MB:.1f}'
+        if used > memory_tracker.log_bytes:
+            print(f"📈 {request.method} {request.path} peaked at +{used / memory_guard.MB:.0f} MB")
+    return response
+
+@app.teardown_request
+def finish_memory_tracking(exc):
+    # after_request is skipped when a request fails outright
+    token = g.pop('memory', None)
+    if token is not None:
+        memory_tracker.finish(token, request.endpoint or request.path)
 
 def load_model():
     """Load the pre-trained GRU model and initialize with dataset"""
-    global model, scaler, label_encoder
+    global model, scaler, label_encoder, monitor, streaming_predictor, prediction_store, feature_extractor
+    global prediction_cache, model_version, model_reloader, model_variant, FEATURE_COLUMNS
     try:
-        # Load the GRU model
-        model_path = os.path.join('..', 'gru_water_quality.h5')
+        # A configured feature selection must exist in the training data and fit the model
+        dataset_path = os.path.join('..', 'selected_features_water_quality.csv')
+        if os.path.exists(dataset_path):
+            FEATURE_COLUMNS = check_features(FEATURE_COLUMNS, columns=pd.read_csv(dataset_path, nrows=0).columns)
+        
+        # Load the GRU model (MODEL_PATH may also point at a bundle directory)
+        model_path = model_file(MODEL_PATH)
         if os.path.exists(model_path):
             model = tf.keras.models.load_model(model_path)
+            model_variant = 'gru'
             print("✅ GRU model loaded successfully")
+            FEATURE_COLUMNS = check_features(FEATURE_COLUMNS, n_inputs=model.input_shape[-1])
+            if model.input_shape[-1] != len(FEATURE_COLUMNS):
+                print(f"⚠️ Model expects {model.input_shape[-1]} features but {len(FEATURE_COLUMNS)} are selected; retrain the model")
         else:
             print("⚠️ Model file not found, will create and train model with dataset")
+            model_variant = 'trained'
             model = create_and_train_model()
         
         # Initialize scaler and label encoder
@@ -48,12 +134,10 @@ def load_model():
         label_encoder = LabelEncoder()
         
         # Load and fit on the actual dataset
-        dataset_path = os.path.join('..', 'selected_features_water_quality.csv')
         if os.path.exists(dataset_path):
             df = pd.read_csv(dataset_path)
             # Fit scaler and label encoder on the actual data
-            feature_columns = ['hardness', 'solids', 'chloramines', 'conductivity', 
-                             'organic_carbon', 'trihalomethanes', 'organic_load_index', 'ph_squared']
+            feature_columns = list(FEATURE_COLUMNS)
             X = df[feature_columns]
             y = df['PSI_Level']
             
@@ -61,10 +145,116 @@ def load_model():
             label_encoder.fit(y)
             print(f"✅ Fitted preprocessing on dataset with {len(df)} samples")
             print(f"✅ Classes: {label_encoder.classes_}")
+            
+            # Track live inputs against the training ranges and class mix
+            monitor = InputMonitor(
+                feature_columns, scaler.data_min_, scaler.data_max_, label_encoder.classes_,
+                training_class_counts=np.bincount(label_encoder.transform(y)),
+                reference_data=X.values
+            )
+        
+        # Per-station recurrent state for continuous sensor feeds; a failure here only disables streaming
+        try:
+            streaming_predictor = StreamingPredictor(model, scaler, getattr(label_encoder, 'classes_', None),
+                                                     store=create_state_store())
+        except Exception as e:
+            streaming_predictor = None
+            print(f"⚠️ Streaming inference disabled: {str(e)}")
+        if streaming_predictor is not None:
+            try:
+                restored = streaming_predictor.restore()
+                if restored:
+                    print(f"✅ Restored streaming state for {restored} stations")
+            except Exception as e:
+                print(f"⚠️ Could not restore streaming state, starting empty: {str(e)}")
+        
+        # Score single readings with the distilled student; streaming keeps the recurrent GRU
+        if SERVING_MODEL == 'student':
+            try:
+                student_path = model_file(STUDENT_PATH)
+                model = load_candidate_model(student_path)
+                model_path = student_path
+                model_variant = 'student'
+                print(f"✅ Serving distilled student from {STUDENT_PATH}")
+            except Exception as e:
+                print(f"⚠️ Student model unavailable, serving the GRU: {str(e)}")
+        
+        # Cache outputs for repeated readings, keyed on the model file contents
+        model_version = file_digest(model_path)[:16] if os.path.exists(model_path) else f'untrained-{os.getpid()}-{id(model)}'
+        prediction_cache = create_cache(model.output_shape[-1], model_version)
+        
+        # Pick up a replaced model file without restarting the worker
+        if os.path.exists(model_path):
+            model_reloader = ModelReloader(model_path, load_candidate_model, swap_model, version=model_version)
+            model_reloader.start()
+        
+        # PCA / cluster features fitted by the preprocessing pipeline
+        if os.path.exists(EXTRACTOR_PATH):
+            feature_extractor = FeatureExtractor.load(EXTRACTOR_PATH)
+            print(f"✅ Loaded feature extractor from {EXTRACTOR_PATH}")
+        
+        # Persist scored readings for dashboards
+        try:
+            prediction_store = PredictionStore()
+            print(f"✅ Prediction history stored in {prediction_store.path}")
+        except Exception as e:
+            print(f"⚠️ Prediction history disabled: {str(e)}")
         
     except Exception as e:
         print(f"❌ Error loading model: {str(e)}")
         model = create_mock_model()
+    
+    warm_up_model()
+
+def warm_up_model():
+    """Compile and warm up the served model; the worker only reports ready afterwards"""
+    global model, model_ready, warmup_report
+    model_ready = False
+    if model is None:
+        return
+    try:
+        if not isinstance(model, CompiledPredictor):
+            model = CompiledPredictor(model)
+        if not model.warmed_up:
+            warmup_report = model.warm_up()
+        # A mock model answers requests but must never receive load balancer traffic
+        model_ready = model_variant != 'mock'
+        print(f"✅ Model warmed up at batch sizes {model.batch_sizes}" if model_ready else
+              "⚠️ Serving a mock model; /api/ready will report not ready")
+    except Exception as e:
+        warmup_report = {'error': str(e)}
+        print(f"❌ Model warmup failed: {str(e)}")
+
+def load_candidate_model(path):
+    """Load a replacement model (Keras or student weights), check it fits the served features
+    and classes, and warm it up so it is never cold when swapped in"""
+    global warmup_report
+    candidate = load_model_file(path)
+    if candidate.input_shape[-1] != len(FEATURE_COLUMNS):
+        raise ValueError(f"Model expects {candidate.input_shape[-1]} features but {len(FEATURE_COLUMNS)} are selected")
+    if model is not None and candidate.output_shape[-1] != model.output_shape[-1]:
+        raise ValueError(f"Model has {candidate.output_shape[-1]} classes but the served model has {model.output_shape[-1]}")
+    candidate = CompiledPredictor(candidate)
+    warmup_report = candidate.warm_up()
+    return candidate
+
+def swap_model(new_model, version):
+    """Serve ``new_model`` from now on; requests already running keep the model they read"""
+    global model, model_version, streaming_predictor
+    if streaming_predictor is not None and model_variant != 'student':
+        try:
+            dropped = streaming_predictor.swap_model(new_model)
+            if dropped:
+                print(f"⚠️ Dropped streaming state for {dropped} stations after model swap")
+        except Exception as e:
+            streaming_predictor = None
+            print(f"⚠️ Streaming inference disabled, the new model is not supported: {str(e)}")
+    # Rebind the model before the version: a request reads the version first, so it never
+    # pairs the new version with the old model
+    model = new_model
+    model_version = version
+    if prediction_cache is not None:
+        prediction_cache.invalidate(version)
 
 def create_and_train_model():
     """Create and train GRU model with the actual dataset"""
@@ -79,8 +269,7 @@ def create_and_train_model():
         df = pd.read_csv(dataset_path)
         
         # Prepare features and target
-        feature_columns = ['hardness', 'solids', 'chloramines', 'conductivity', 
-                         'organic_carbon', 'trihalomethanes', 'organic_load_index', 'ph_squared']
+        feature_columns = list(FEATURE_COLUMNS)
         X = df[feature_columns].values
         y = df['PSI_Level'].values
         
@@ -103,7 +292,7 @@ def create_and_train_model():
         
         # Create GRU model
         model = Sequential([
-            GRU(128, return_sequences=True, activation='tanh', input_shape=(1, 8)),
+            GRU(128, return_sequences=True, activation='tanh', input_shape=(1, len(FEATURE_COLUMNS))),
             Dropout(0.3),
             GRU(64, activation='tanh'),
             Dropout(0.3),
@@ -138,11 +327,13 @@ def create_and_train_model():
 
 def create_mock_model():
     """Create a mock GRU model for demonstration purposes"""
+    global model_variant
+    model_variant = 'mock'
     from tensorflow.keras.models import Sequential
     from tensorflow.keras.layers import GRU, Dense, Dropout
     
     model = Sequential([
-        GRU(128, return_sequences=True, activation='tanh', input_shape=(1, 8)),
+        GRU(128, return_sequences=True, activation='tanh', input_shape=(1, len(FEATURE_COLUMNS))),
         Dropout(0.3),
         GRU(64, activation='tanh'),
         Dropout(0.3),
@@ -157,8 +348,13 @@ def preprocess_data(df):
     """Preprocess the dataset for GRU model using the specific water quality features"""
     try:
         # Define the expected feature columns for water quality prediction
-        expected_features = ['hardness', 'solids', 'chloramines', 'conductivity', 
-                           'organic_carbon', 'trihalomethanes', 'organic_load_index', 'ph_squared']
+        expected_features = list(FEATURE_COLUMNS)
+        
+        # Derive PC1 / PC2 / Cluster from the base readings when the model uses them
+        if feature_extractor is not None and any(c in expected_features and c not in df.columns
+                                                 for c in EXTRACTED_COLUMNS):
+            if all(f in df.columns for f in feature_extractor.features):
+                df = feature_extractor.transform_frame(df)
         
         # Check if we have the expected features
         available_features = [col for col in expected_features if col in df.columns]
@@ -206,6 +402,83 @@ def preprocess_data(df):
     except Exception as e:
         raise Exception(f"Error preprocessing data: {str(e)}")
 
+def read_uploaded_file(file):
+    """Parse an uploaded CSV or Excel file; returns None for other formats
+
+    Raises ``memory_guard.UploadTooLarge`` if parsing would exceed the memory budget.
+    """
+    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
+        return None
+    plan = memory_guard.plan_upload(file, streamable=False)
+    if plan['action'] != 'parse':
+        raise memory_guard.UploadTooLarge(plan)
+    # Parse straight from the (disk-spooled) upload instead of holding its bytes and decoded text
+    if file.filename.endswith('.csv'):
+        return pd.read_csv(file.stream, encoding='utf-8')
+    return pd.read_excel(file.stream)
+
+def run_validation(df, quick_train=False):
+    """Score the held-out 20% of a labelled dataset and compute metrics"""
+    # Preprocess data
+    X, y, feature_names = preprocess_data(df)
+    
+    # Split data for validation
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    
+    # Use one model for the whole request even if a reload swaps it meanwhile
+    current_model = model
+    
+    # Train model if needed (for demonstration)
+    if quick_train and current_model.get_weights() == []:  # If model is not trained
+        # Convert labels to categorical
+        from tensorflow.keras.utils import to_categorical
+        y_train_cat = to_categorical(y_train)
+        
+        # Quick training for demo
+        current_model.fit(X_train, y_train_cat, epochs=5, batch_size=32, verbose=0, validation_split=0.2)
+    
+    # Make predictions
+    y_pred_proba = current_model.predict(X_test)
+    y_pred = np.argmax(y_pred_proba, axis=1)
+    
+    # Every metric and its bootstrap interval comes from one confusion matrix
+    class_names = label_encoder.classes_ if hasattr(label_encoder, 'classes_') else None
+    results = evaluate(y_test, y_pred, class_names)
+    results.update({
+        'test_samples': len(y_test),
+        'feature_count': len(feature_names),
+        'class_distribution': {str(k): int(v) for k, v in zip(*np.unique(y_test, return_counts=True))}
+    })
+    return results
+
+def run_streaming_validation(stream, chunk_rows=memory_guard.STREAM_CHUNK_ROWS):
+    """Validate a CSV too large to parse at once, keeping only a confusion matrix
+
+    Instead of the stratified 20% split, a seeded 20% sample of every chunk is scored.
+    """
+    current_model = model
+    class_names = label_encoder.classes_ if hasattr(label_encoder, 'classes_') else None
+    n_classes = max(len(class_names) if class_names is not None else 0, current_model.output_shape[-1])
+    cm = np.zeros((n_classes, n_classes), dtype=np.int64)
+    rng = np.random.default_rng(42)
+    feature_names = []
+    for chunk in pd.read_csv(stream, chunksize=chunk_rows, encoding='utf-8'):
+        test = chunk[rng.random(len(chunk)) < 0.2]
+        if test.empty:
+            continue
+        X, y, feature_names = preprocess_data(test)
+        y_pred = np.argmax(current_model.predict(X, verbose=0), axis=1)
+        cm += confusion_matrix(y, y_pred, n_classes)
+    
+    results = evaluate_matrix(cm, class_names)
+    results.update({
+        'test_samples': int(cm.sum()),
+        'feature_count': len(feature_names),
+        'class_distribution': {str(k): int(v) for k, v in enumerate(cm.sum(axis=1)) if v},
+        'mode': 'streaming'
+    })
+    return results
+
 @app.route('/api/browse-dataset', methods=['POST'])
 def browse_dataset():
     """Browse and display dataset information"""
@@ -218,28 +491,143 @@ def browse_dataset():
             return jsonify({'error': 'No file selected'}), 400
         
         # Read the file
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(file.read().decode('utf-8')))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(file.read()))
-        else:
+        df = read_uploaded_file(file)
+        if df is None:
             return jsonify({'error': 'Unsupported file format. Please use CSV or Excel files.'}), 400
         
-        # Get dataset information
-        dataset_info = {
-            'shape': list(df.shape),
-            'columns': df.columns.tolist(),
-            'sample': df.head().to_dict('records'),
-            'dtypes': df.dtypes.astype(str).to_dict(),
-            'missing_values': df.isnull().sum().to_dict(),
-            'description': df.describe().to_dict() if len(df.select_dtypes(include=[np.number]).columns) > 0 else {}
-        }
+        # Get dataset information, with the row sample paginated by cursor
+        try:
+            body = dataset_json(df, cursor=request.args.get('cursor'),
+                                limit=request.args.get('limit', 5, type=int), layout=request_layout())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return compressed_response(body)
+        
+    except memory_guard.UploadTooLarge as e:
+        return jsonify({'error': str(e), 'memory': e.plan}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def get_dataset_sessions():
+    """Create the session store on first use so read-only deployments still start"""
+    global dataset_sessions
+    if dataset_sessions is None:
+        dataset_sessions = DatasetSessionStore()
+    return dataset_sessions
+
+def requested_columns():
+    columns = request.args.get('columns')
+    return [c for c in columns.split(',') if c] if columns else None
+
+@app.route('/api/datasets', methods=['POST'])
+def upload_dataset():
+    """Parse an uploaded dataset once and keep it server-side under an id"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        # Read the file
+        df = read_uploaded_file(file)
+        if df is None:
+            return jsonify({'error': 'Unsupported file format. Please use CSV or Excel files.'}), 400
+        
+        return jsonify(get_dataset_sessions().create(df, file.filename)), 201
+        
+    except memory_guard.UploadTooLarge as e:
+        return jsonify({'error': str(e), 'memory': e.plan}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>', methods=['GET'])
+def dataset_summary(dataset_id):
+    """Same summary as /api/browse-dataset for a stored dataset"""
+    try:
+        df = get_dataset_sessions().frame(dataset_id, columns=requested_columns())
+        body = dataset_json(df, cursor=request.args.get('cursor'),
+                            limit=request.args.get('limit', 5, type=int), layout=request_layout(),
+                            extra={'dataset_id': dataset_id})
+        return compressed_response(body)
+        
+    except DatasetNotFound:
+        return jsonify({'error': 'Dataset not found or expired'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/rows', methods=['GET'])
+def dataset_rows(dataset_id):
+    """Rows start:stop of the selected columns, read from the memory-mapped file"""
+    try:
+        start = request.args.get('start', 0, type=int)
+        stop = request.args.get('stop', start + 100, type=int)
+        if stop - start > 10000:
+            return jsonify({'error': 'At most 10000 rows per request'}), 400
         
-        return jsonify(dataset_info)
+        layout = request_layout()
+        df = get_dataset_sessions().frame(dataset_id, columns=requested_columns(), start=start, stop=stop)
+        return compressed_response(object_json({
+            'dataset_id': dataset_id,
+            'start': start,
+            'stop': start + len(df),
+            'layout': layout,
+            'rows': RawJSON(frame_json(df, layout))
+        }))
+        
+    except DatasetNotFound:
+        return jsonify({'error': 'Dataset not found or expired'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>/stats', methods=['GET'])
+def dataset_stats(dataset_id):
+    """Column statistics and missing counts for a stored dataset"""
+    try:
+        stats = get_dataset_sessions().column_stats(dataset_id, columns=requested_columns())
+        return compressed_response(object_json(dict(stats, dataset_id=dataset_id)))
         
+    except DatasetNotFound:
+        return jsonify({'error': 'Dataset not found or expired'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/datasets/<dataset_id>/validate', methods=['POST'])
+def dataset_validate(dataset_id):
+    """Validate the model on a stored dataset without re-uploading it"""
+    try:
+        sessions = get_dataset_sessions()
+        meta = sessions.meta(dataset_id)
+        validation_results = run_validation(sessions.frame(dataset_id), quick_train=True)
+        validation_results['dataset_id'] = dataset_id
+        
+        if prediction_store is not None:
+            prediction_store.record_validation(validation_results, source=meta['filename'])
+        
+        return jsonify(validation_results)
+        
+    except DatasetNotFound:
+        return jsonify({'error': 'Dataset not found or expired'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/datasets/<dataset_id>', methods=['DELETE'])
+def dataset_delete(dataset_id):
+    """Remove a stored dataset before its TTL expires"""
+    try:
+        get_dataset_sessions().delete(dataset_id)
+        return jsonify({'dataset_id': dataset_id, 'deleted': True})
+    except DatasetNotFound:
+        return jsonify({'error': 'Dataset not found or expired'}), 404
+
 @app.route('/api/validate', methods=['POST'])
 def validate_model():
     """Validate the GRU model on uploaded dataset"""
@@ -254,57 +642,26 @@ def validate_model():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Read the file
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.StringIO(file.read().decode('utf-8')))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(io.BytesIO(file.read()))
+        # CSVs too large to parse within the memory budget are scored chunk by chunk
+        plan = memory_guard.plan_upload(file) if file.filename.endswith('.csv') else None
+        if plan is not None and plan['action'] == 'stream':
+            print(f"📉 Streaming validation of {file.filename} (~{plan['estimated_mb']:.0f} MB to parse)")
+            validation_results = run_streaming_validation(file.stream)
         else:
-            return jsonify({'error': 'Unsupported file format. Please use CSV or Excel files.'}), 400
-        
-        # Preprocess data
-        X, y, feature_names = preprocess_data(df)
-        
-        # Split data for validation
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-        
-        # Train model if needed (for demonstration)
-        if model.get_weights() == []:  # If model is not trained
-            # Convert labels to categorical
-            from tensorflow.keras.utils import to_categorical
-            y_train_cat = to_categorical(y_train)
-            y_test_cat = to_categorical(y_test)
+            # Read the file
+            df = read_uploaded_file(file)
+            if df is None:
+                return jsonify({'error': 'Unsupported file format. Please use CSV or Excel files.'}), 400
             
-            # Quick training for demo
-            model.fit(X_train, y_train_cat, epochs=5, batch_size=32, verbose=0, validation_split=0.2)
-        
-        # Make predictions
-        y_pred_proba = model.predict(X_test)
-        y_pred = np.argmax(y_pred_proba, axis=1)
-        
-        # Calculate metrics
-        accuracy = accuracy_score(y_test, y_pred)
-        precision = precision_score(y_test, y_pred, average='weighted', zero_division=0)
-        recall = recall_score(y_test, y_pred, average='weighted', zero_division=0)
-        f1 = f1_score(y_test, y_pred, average='weighted', zero_division=0)
-        
-        # Generate classification report
-        class_names = label_encoder.classes_ if hasattr(label_encoder, 'classes_') else [f'Class_{i}' for i in range(len(np.unique(y)))]
-        class_report = classification_report(y_test, y_pred, target_names=class_names, zero_division=0)
-        
-        validation_results = {
-            'accuracy': float(accuracy),
-            'precision': float(precision),
-            'recall': float(recall),
-            'f1_score': float(f1),
-            'classification_report': class_report,
-            'test_samples': len(y_test),
-            'feature_count': len(feature_names),
-            'class_distribution': {str(k): int(v) for k, v in zip(*np.unique(y_test, return_counts=True))}
-        }
+            validation_results = run_validation(df, quick_train=True)
+        
+        if prediction_store is not None:
+            prediction_store.record_validation(validation_results, source=file.filename)
         
         return jsonify(validation_results)
         
+    except memory_guard.UploadTooLarge as e:
+        return jsonify({'error': str(e), 'memory': e.plan}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -317,11 +674,24 @@ def predict():
         if not data or 'features' not in data:
             return jsonify({'error': 'No features provided'}), 400
         
+        # Reject a malformed timestamp before scoring, not when the result is stored
+        try:
+            timestamp = to_epoch(data.get('timestamp'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Convert features to numpy array and reshape for GRU
         features = np.array(data['features']).reshape(1, 1, -1)
         
-        # Make prediction
-        prediction_proba = model.predict(features)
+        # Make prediction, reusing the cached output for repeated readings
+        version, current_model = model_version, model
+        cached = prediction_cache.get(features, version) if prediction_cache is not None else None
+        if cached is not None:
+            prediction_proba = cached.reshape(1, -1)
+        else:
+            prediction_proba = current_model.predict(features)
+            if prediction_cache is not None:
+                prediction_cache.put(features, prediction_proba[0], version)
         prediction_class = np.argmax(prediction_proba, axis=1)[0]
         confidence = float(np.max(prediction_proba))
         
@@ -333,6 +703,9 @@ def predict():
             class_names = ['Severe', 'Moderate']
             predicted_class_name = class_names[prediction_class] if prediction_class < len(class_names) else f'Class_{prediction_class}'
         
+        if monitor is not None:
+            monitor.update(features.reshape(1, -1), [prediction_class])
+        
         result = {
             'predicted_class': predicted_class_name,
             'confidence': confidence,
@@ -342,11 +715,211 @@ def predict():
             }
         }
         
+        if prediction_store is not None:
+            prediction_store.record_predictions([(
+                timestamp, data.get('station_id'), predicted_class_name,
+                confidence, data['features'], result['probabilities']
+            )])
+        
         return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def score_station_readings(readings):
+    """Score a list of {'station_id', 'features'} readings with per-station state"""
+    if not readings or any(not isinstance(r, dict) or 'station_id' not in r or 'features' not in r
+                           for r in readings):
+        raise ValueError('Each reading needs station_id and features')
+    
+    station_ids = [str(r['station_id']) for r in readings]
+    if len(set(station_ids)) != len(station_ids):
+        raise ValueError('Each station may only appear once per batch')
+    
+    # Validate everything before any station's state advances
+    timestamps = [to_epoch(r.get('timestamp')) for r in readings]
+    features = np.array([r['features'] for r in readings], dtype=float)
+    probabilities, steps = streaming_predictor.predict(station_ids, features)
+    predicted = np.argmax(probabilities, axis=1)
+    
+    if monitor is not None:
+        monitor.update(features, predicted)
+    
+    class_names = streaming_predictor.class_names or [f'Class_{i}' for i in range(probabilities.shape[1])]
+    results = [{
+        'station_id': station_id,
+        'timestamp': readings[i].get('timestamp'),
+        'predicted_class': class_names[predicted[i]],
+        'confidence': float(probabilities[i, predicted[i]]),
+        'probabilities': {class_names[j]: float(p) for j, p in enumerate(probabilities[i])},
+        'steps': steps[i]
+    } for i, station_id in enumerate(station_ids)]
+    
+    if prediction_store is not None:
+        prediction_store.record_predictions([
+            (ts, r['station_id'], r['predicted_class'], r['confidence'], f, r['probabilities'])
+            for r, f, ts in zip(results, features, timestamps)
+        ], source='stream')
+    
+    return results
+
+@app.route('/api/stream/predict', methods=['POST'])
+def stream_predict():
+    """Advance one or more stations by a single reading each"""
+    try:
+        if streaming_predictor is None:
+            return jsonify({'error': 'Streaming inference not initialized'}), 503
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No readings provided'}), 400
+        
+        # Accept either a single reading or {'readings': [...]}
+        try:
+            results = score_station_readings(data.get('readings', [data]))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'predictions': results})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def ingest_lines(stream):
+    """Yield one NDJSON line of predictions or errors per line read from stream"""
+    for line_number, record, error in iter_ndjson(stream):
+        if error is None:
+            readings = record.get('readings', [record]) if isinstance(record, dict) else record
+            try:
+                for result in score_station_readings(readings):
+                    yield json.dumps(result) + '\n'
+                continue
+            except Exception as e:
+                error = str(e)
+        yield json.dumps({'line': line_number, 'error': error}) + '\n'
+
+@app.route('/api/stream/ingest', methods=['POST'])
+def stream_ingest():
+    """Score newline-delimited readings as they arrive on one long-lived request
+    
+    The request body is read lazily while the response is being written, so a
+    client that stops reading predictions stops having its readings consumed.
+    Needs the async server: a gunicorn sync worker would be held for as long as
+    the connection stays open.
+    """
+    if 'SERVER_WORKERS' in os.environ and not admission.get_controller().enforced:
+        return jsonify({'error': 'Streaming ingestion needs SERVER_MODE=async; use /api/stream/predict '
+                                 'with sync workers'}), 503
+    if streaming_predictor is None:
+        return jsonify({'error': 'Streaming inference not initialized'}), 503
+    
+    return Response(stream_with_context(ingest_lines(request.stream)),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stream/stations', methods=['GET'])
+def stream_stations():
+    """Report how many stations currently hold streaming state"""
+    if streaming_predictor is None:
+        return jsonify({'error': 'Streaming inference not initialized'}), 503
+    return jsonify(streaming_predictor.stats())
+
+@app.route('/api/stream/stations/<station_id>', methods=['DELETE'])
+def stream_reset_station(station_id):
+    """Forget the recurrent state of a single station"""
+    if streaming_predictor is None:
+        return jsonify({'error': 'Streaming inference not initialized'}), 503
+    return jsonify({'station_id': station_id, 'reset': streaming_predictor.reset(station_id)})
+
+@app.route('/api/stream/snapshot', methods=['POST'])
+def stream_snapshot():
+    """Persist all station states to disk (the shared SQLite store already is)"""
+    try:
+        if streaming_predictor is None:
+            return jsonify({'error': 'Streaming inference not initialized'}), 503
+        return jsonify({'stations_saved': streaming_predictor.snapshot()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/extract-features', methods=['POST'])
+def extract_features():
+    """Compute PC1, PC2 and Cluster for a batch of base readings"""
+    try:
+        if feature_extractor is None:
+            return jsonify({'error': 'Feature extractor not available; run pipeline.py first'}), 503
+        
+        data = request.get_json()
+        if not data or 'rows' not in data:
+            return jsonify({'error': 'No rows provided'}), 400
+        
+        # Rows may be lists ordered like the extractor features or dicts keyed by name
+        rows = data['rows']
+        if rows and isinstance(rows[0], dict):
+            missing = [f for f in feature_extractor.features if f not in rows[0]]
+            if missing:
+                return jsonify({'error': f'Missing features: {missing}'}), 400
+            rows = [[r[f] for f in feature_extractor.features] for r in rows]
+        
+        components, clusters = feature_extractor.transform(rows, raw=not data.get('scaled', True))
+        return jsonify({
+            'features': feature_extractor.features,
+            'rows': [{
+                **{f'PC{j + 1}': float(v) for j, v in enumerate(components[i])},
+                'Cluster': int(clusters[i])
+            } for i in range(len(clusters))]
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/psi', methods=['POST'])
+def label_psi():
+    """Compute the Pollution Severity Index and level for an uploaded raw dataset"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        # Read the file
+        df = read_uploaded_file(file)
+        if df is None:
+            return jsonify({'error': 'Unsupported file format. Please use CSV or Excel files.'}), 400
+        
+        # Optional JSON overrides for weights, bin_edges, levels and ranges, checked like the config file
+        config = psi.load_config(os.environ.get('PSI_CONFIG_PATH'))
+        try:
+            if request.form.get('config'):
+                config = psi.merge_config(config, request.form['config'])
+            labelled = psi.label_dataframe(df, config)
+        except (ValueError, json.JSONDecodeError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if request.args.get('format') == 'csv':
+            return Response(labelled.to_csv(index=False), mimetype='text/csv', headers={
+                'Content-Disposition': f'attachment; filename=psi_{os.path.basename(file.filename)}'
+            })
+        
+        counts = psi.level_counts(labelled['PSI_Level'].to_numpy(), config)
+        return jsonify({
+            'rows': len(labelled),
+            'level_counts': {level: int(c) for level, c in zip(config['levels'], counts)},
+            'unlabelled_rows': int(counts[-1]),
+            'psi_summary': labelled['PSI'].describe().to_dict(),
+            'weights': config['weights'],
+            'bin_edges': config['bin_edges'],
+            'sample': labelled.head(10).to_dict('records')
+        })
+        
+    except memory_guard.UploadTooLarge as e:
+        return jsonify({'error': str(e), 'memory': e.plan}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/load-default-dataset', methods=['GET'])
 def load_default_dataset():
     """Load and return the default water quality dataset"""
@@ -357,22 +930,19 @@ def load_default_dataset():
         
         df = pd.read_csv(dataset_path)
         
-        # Get dataset information
-        dataset_info = {
-            'shape': list(df.shape),
-            'columns': df.columns.tolist(),
-            'sample': df.head(10).to_dict('records'),
-            'dtypes': df.dtypes.astype(str).to_dict(),
-            'missing_values': df.isnull().sum().to_dict(),
-            'description': df.describe().to_dict(),
-            'class_distribution': df['PSI_Level'].value_counts().to_dict() if 'PSI_Level' in df.columns else {},
-            'feature_names': ['hardness', 'solids', 'chloramines', 'conductivity', 
-                            'organic_carbon', 'trihalomethanes', 'organic_load_index', 'ph_squared'],
-            'target_name': 'PSI_Level',
-            'total_samples': len(df)
-        }
+        # Get dataset information, with the row sample paginated by cursor
+        try:
+            body = dataset_json(df, cursor=request.args.get('cursor'),
+                                limit=request.args.get('limit', 10, type=int), layout=request_layout(), extra={
+                'class_distribution': RawJSON(df['PSI_Level'].value_counts().to_json()) if 'PSI_Level' in df.columns else {},
+                'feature_names': list(FEATURE_COLUMNS),
+                'target_name': 'PSI_Level',
+                'total_samples': len(df)
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify(dataset_info)
+        return compressed_response(body)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -387,52 +957,165 @@ def validate_default_dataset():
         
         df = pd.read_csv(dataset_path)
         
-        # Preprocess data
-        X, y, feature_names = preprocess_data(df)
-        
-        # Split data for validation
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-        
-        # Make predictions
-        y_pred_proba = model.predict(X_test)
-        y_pred = np.argmax(y_pred_proba, axis=1)
-        
-        # Calculate metrics
-        accuracy = accuracy_score(y_test, y_pred)
-        precision = precision_score(y_test, y_pred, average='weighted', zero_division=0)
-        recall = recall_score(y_test, y_pred, average='weighted', zero_division=0)
-        f1 = f1_score(y_test, y_pred, average='weighted', zero_division=0)
-        
-        # Generate classification report
-        class_names = label_encoder.classes_ if hasattr(label_encoder, 'classes_') else [f'Class_{i}' for i in range(len(np.unique(y)))]
-        class_report = classification_report(y_test, y_pred, target_names=class_names, zero_division=0)
-        
-        validation_results = {
-            'accuracy': float(accuracy),
-            'precision': float(precision),
-            'recall': float(recall),
-            'f1_score': float(f1),
-            'classification_report': class_report,
-            'test_samples': len(y_test),
-            'feature_count': len(feature_names),
-            'class_distribution': {str(k): int(v) for k, v in zip(*np.unique(y_test, return_counts=True))}
-        }
+        validation_results = run_validation(df)
+        
+        if prediction_store is not None:
+            prediction_store.record_validation(validation_results, source='default')
         
         return jsonify(validation_results)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/monitor', methods=['GET'])
+def monitor_status():
+    """Input drift and out-of-range statistics for this worker"""
+    if monitor is None:
+        return jsonify({'error': 'Monitor not initialized'}), 503
+    
+    status = monitor.snapshot()
+    status['worker_pid'] = os.getpid()
+    return jsonify(status)
+
+@app.route('/api/cache', methods=['GET'])
+def cache_status():
+    """Prediction cache size and hit rate for this worker"""
+    if prediction_cache is None:
+        return jsonify({'mode': 'off'})
+    return jsonify(prediction_cache.info())
+
+@app.route('/api/model', methods=['GET'])
+def model_status():
+    """Served model version and hot reload counters for this worker"""
+    if model_reloader is None:
+        return jsonify({'version': model_version, 'variant': model_variant, 'watching': False,
+                        'worker_pid': os.getpid()})
+    return jsonify(dict(model_reloader.stats(), variant=model_variant))
+
+@app.route('/api/admin/reload-model', methods=['POST'])
+def reload_model():
+    """Load the model at MODEL_PATH in this worker now instead of waiting for the watcher"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'Model reload is disabled; set ADMIN_TOKEN to enable it'}), 403
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if model_reloader is None:
+        return jsonify({'error': 'No model file to reload'}), 404
+    try:
+        force = request.args.get('force', 'false').lower() == 'true'
+        result = model_reloader.reload(trigger='admin', force=force)
+        result['worker_pid'] = os.getpid()
+        status = {'failed': 500, 'in_progress': 409}.get(result['status'], 200)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admission', methods=['GET'])
+def admission_status():
+    """Per-lane concurrency, queue depth and shedding counters for this worker"""
+    status = admission.stats()
+    status['worker_pid'] = os.getpid()
+    return jsonify(status)
+
+@app.route('/api/memory', methods=['GET'])
+def memory_status():
+    """Peak memory per endpoint and the upload memory budget for this worker"""
+    status = memory_tracker.stats()
+    status['budget_mb'] = memory_guard.MEMORY_BUDGET_MB
+    status['worker_pid'] = os.getpid()
+    return jsonify(status)
+
+@app.route('/api/history', methods=['GET'])
+def prediction_history():
+    """Stored predictions filtered by station and time range"""
+    try:
+        if prediction_store is None:
+            return jsonify({'error': 'Prediction history not available'}), 503
+        
+        predictions = prediction_store.query_predictions(
+            station=request.args.get('station_id'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=min(request.args.get('limit', 1000, type=int), 10000)
+        )
+        return jsonify({'predictions': predictions, 'count': len(predictions)})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history/hourly', methods=['GET'])
+def prediction_history_hourly():
+    """Predicted class counts per hour"""
+    try:
+        if prediction_store is None:
+            return jsonify({'error': 'Prediction history not available'}), 503
+        
+        hours = prediction_store.hourly_class_counts(
+            station=request.args.get('station_id'),
+            start=request.args.get('start'),
+            end=request.args.get('end')
+        )
+        return jsonify({'hours': hours, 'writer': prediction_store.stats()})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/history/validations', methods=['GET'])
+def validation_history():
+    """Most recent validation results"""
+    try:
+        if prediction_store is None:
+            return jsonify({'error': 'Prediction history not available'}), 503
+        limit = min(request.args.get('limit', 20, type=int), 1000)
+        return jsonify({'validations': prediction_store.recent_validations(limit)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    reload_stats = model_reloader.stats() if model_reloader is not None else {}
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None,
+        'model_loaded': model is not None and model_variant != 'mock',
+        'ready': model_ready,
+        'model_version': model_version,
+        'model_variant': model_variant,
+        'model_reloads': reload_stats.get('reloads', 0),
+        'model_reload_failures': reload_stats.get('failures', 0),
+        'last_model_reload': reload_stats.get('last_reload'),
         'message': 'Water Quality Prediction API is running',
         'dataset_available': os.path.exists(os.path.join('..', 'selected_features_water_quality.csv'))
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until a real model is loaded and warmed up"""
+    status = {
+        'ready': model_ready,
+        'model_variant': model_variant,
+        'model_version': model_version,
+        'warmup': warmup_report,
+        'worker_pid': os.getpid(),
+    }
+    if not model_ready:
+        if model is None:
+            status['reason'] = 'Model is loading'
+        elif model_variant == 'mock':
+            status['reason'] = 'Serving the untrained mock model'
+        elif warmup_report is not None and 'error' in warmup_report:
+            status['reason'] = f"Warmup failed: {warmup_report['error']}"
+        else:
+            status['reason'] = 'Model is warming up'
+        return jsonify(status), 503
+    return jsonify(status)
+
 if __name__ == '__main__':
     print("🚀 Starting Water Quality Prediction API...")
     load_model()
@@ -0,0 +1,269 @@
+"""ASGI entry point: non-blocking request I/O with inference on thread pools
+
+Serve with uvicorn workers instead of gunicorn's ``sync`` worker:
+    SERVER_MODE=async gunicorn --config gunicorn_config.py
+
+The event loop receives request bodies and sends responses, so a slow
+client costs a coroutine and a buffer rather than a whole worker process.
+Each request is admitted to a lane (see ``admission.py``) before its body
+is read; the Flask app (parsing, inference, metrics) only starts once the
+body has fully arrived, and runs on that lane's thread pool. Paths listed in
+``ASGI_STREAM_PATHS`` are instead handed their body incrementally on a
+separate pool, so long-lived ingestion never starves regular requests.
+"""
+import asyncio
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import STREAM_PATHS, Rejection, get_controller
+from app import app as flask_app, load_model
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 4))
+ASGI_STREAM_THREADS = int(os.environ.get('ASGI_STREAM_THREADS', 4))
+ASGI_SPOOL_BYTES = int(os.environ.get('ASGI_SPOOL_BYTES', 1024 * 1024))
+
+# Chunks a streaming request may have buffered ahead of the handler
+STREAM_BUFFER_CHUNKS = 8
+
+
+class BodyPipe:
+    """``wsgi.input`` fed chunk by chunk from the event loop
+
+    The handler thread blocks on the queue; the loop side waits on a
+    semaphore, so at most ``max_chunks`` unread chunks are held and a slow
+    handler pushes back on the client through TCP.
+    """
+
+    def __init__(self, loop, max_chunks=STREAM_BUFFER_CHUNKS):
+        self._loop = loop
+        self._chunks = queue.Queue()
+        self._space = asyncio.Semaphore(max_chunks)
+        self._buffer = b''
+        self._done = False
+
+    async def feed(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            await self._space.acquire()
+            self._chunks.put(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        self._chunks.put(None)
+
+    def _fill(self):
+        if self._done:
+            return False
+        chunk = self._chunks.get()
+        if chunk is None:
+            self._done = True
+            return False
+        self._loop.call_soon_threadsafe(self._space.release)
+        self._buffer += chunk
+        return True
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        while b'\n' not in self._buffer and (size is None or size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class AsyncWSGIAdapter:
+    """Run a WSGI app behind an ASGI server without blocking the event loop"""
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS, stream_threads=ASGI_STREAM_THREADS,
+                 stream_paths=STREAM_PATHS, spool_bytes=ASGI_SPOOL_BYTES, on_startup=None):
+        self.wsgi_app = wsgi_app
+        self.admission = get_controller(default_threads=threads)
+        self.admission.enforced = True
+        self.stream_executor = ThreadPoolExecutor(max_workers=stream_threads, thread_name_prefix='wsgi-stream')
+        self.stream_paths = stream_paths
+        self.spool_bytes = spool_bytes
+        self.on_startup = on_startup
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup is not None:
+                        await loop.run_in_executor(self.admission.lanes['default'].executor, self.on_startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.admission.shutdown()
+                self.stream_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        if scope['path'] in self.stream_paths:
+            body = BodyPipe(loop)
+            feeder = loop.create_task(body.feed(receive))
+            environ = self.environ(scope, body)
+            try:
+                await loop.run_in_executor(self.stream_executor, self.run_wsgi, environ, send, loop)
+            finally:
+                feeder.cancel()
+            return
+
+        lane = self.admission.lane_for(scope['method'], scope['path'])
+        content_length = self.content_length(scope)
+        try:
+            lane.admit(content_length)
+        except Rejection as e:
+            await self.reject(send, e)
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        try:
+            size = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                # Chunked uploads carry no Content-Length, so check as the body arrives
+                lane.check_size(size)
+                body.write(chunk)
+                if not message.get('more_body', False):
+                    break
+            body.seek(0)
+            environ = self.environ(scope, body, content_length=size)
+            # The queue wait starts once the upload is complete
+            await loop.run_in_executor(lane.executor, lane.run, time.monotonic(),
+                                       self.run_wsgi, environ, send, loop)
+        except Rejection as e:
+            await self.reject(send, e)
+        finally:
+            lane.release(content_length)
+            body.close()
+
+    @staticmethod
+    def content_length(scope):
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    @staticmethod
+    async def reject(send, rejection):
+        body = json.dumps({'error': rejection.message}).encode()
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        if rejection.retry_after is not None:
+            headers.append((b'retry-after', str(rejection.retry_after).encode()))
+        await send({'type': 'http.response.start', 'status': rejection.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def environ(scope, body, content_length=None):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+            'REMOTE_ADDR': str(client[0]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+        if content_length is not None:
+            # The body was fully read, so chunked uploads get an exact length too
+            environ['CONTENT_LENGTH'] = str(content_length)
+        return environ
+
+    def run_wsgi(self, environ, send, loop):
+        """Call the app and iterate its response on one pool thread
+
+        Flask's ``stream_with_context`` binds the request context to the
+        thread that first iterates the response, so the whole response is
+        produced here and each chunk is handed to the loop, waiting until it
+        has been sent.
+        """
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        def start():
+            if not response.get('sent'):
+                response['sent'] = True
+                send_sync({'type': 'http.response.start', 'status': response['status'],
+                           'headers': response['headers']})
+
+        iterable = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    start()
+                    send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            start()
+            send_sync({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+app = AsyncWSGIAdapter(flask_app, on_startup=load_model)
@@ -0,0 +1,179 @@
+"""Compare sync and async serving under many concurrent slow uploads
+
+Each slow client trickles a CSV upload to ``/api/browse-dataset`` in small
+chunks while a probe measures ``/api/health`` latency. With sync workers
+every slow upload pins a worker process, so the probe queues or times out;
+in async mode uploads are buffered by the event loop and the probe is
+answered immediately.
+
+Usage:
+    python bench_async.py --compare [--uploads 50] [--workers 2]
+    python bench_async.py --url http://localhost:5000 [--uploads 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BACKEND_DIR, '..', 'selected_features_water_quality.csv')
+BOUNDARY = 'benchasyncboundary'
+
+
+def upload_body(rows):
+    with open(DATASET_PATH, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)[:rows + 1]
+    head = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="bench.csv"\r\n'
+            'Content-Type: text/csv\r\n\r\n').encode()
+    return head + b''.join(lines) + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+async def request(host, port, method, path, body=b'', content_type=None, chunk_bytes=None, interval=0.0):
+    """Send one request (optionally trickling the body) and return the status code"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+                   f'Content-Length: {len(body)}']
+        if content_type:
+            headers.append(f'Content-Type: {content_type}')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode())
+        step = chunk_bytes or len(body) or 1
+        for start in range(0, len(body), step):
+            writer.write(body[start:start + step])
+            await writer.drain()
+            if interval:
+                await asyncio.sleep(interval)
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1]) if status_line else 0
+    finally:
+        writer.close()
+
+
+async def slow_upload(host, port, body, chunk_bytes, interval, timeout):
+    started = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(
+            request(host, port, 'POST', '/api/browse-dataset', body,
+                    f'multipart/form-data; boundary={BOUNDARY}', chunk_bytes, interval), timeout)
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+async def probe(host, port, stop, timeout, interval=0.1):
+    """Repeated health checks; failures and timeouts are recorded as None"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(request(host, port, 'GET', '/api/health'), timeout)
+            latencies.append(time.perf_counter() - started if status == 200 else None)
+        except Exception:
+            latencies.append(None)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run_scenario(url, uploads, rows, chunk_bytes, interval, timeout):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    body = upload_body(rows)
+    stop = asyncio.Event()
+    probe_task = asyncio.ensure_future(probe(host, port, stop, timeout))
+    started = time.perf_counter()
+    results = await asyncio.gather(*[slow_upload(host, port, body, chunk_bytes, interval, timeout)
+                                     for _ in range(uploads)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    latencies = await probe_task
+
+    ok = [t for t in latencies if t is not None]
+    upload_times = [t for status, t in results if status == 200]
+    return {
+        'uploads': uploads,
+        'upload_bytes': len(body),
+        'uploads_ok': len(upload_times),
+        'upload_seconds_p50': float(np.percentile(upload_times, 50)) if upload_times else None,
+        'wall_seconds': elapsed,
+        'probe_requests': len(latencies),
+        'probe_failures': len(latencies) - len(ok),
+        'probe_ms_p50': float(np.percentile(ok, 50) * 1000) if ok else None,
+        'probe_ms_p99': float(np.percentile(ok, 99) * 1000) if ok else None,
+    }
+
+
+def start_server(mode, port, workers):
+    env = dict(os.environ, SERVER_MODE=mode, PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn_config.py', '--workers', str(workers),
+         '--log-level', 'warning', '--access-logfile', '/dev/null'],
+        cwd=BACKEND_DIR, env=env)
+
+    async def wait_ready(deadline):
+        while time.time() < deadline:
+            try:
+                if await asyncio.wait_for(request('127.0.0.1', port, 'GET', '/api/health'), 5) == 200:
+                    return
+            except Exception:
+                pass
+            await asyncio.sleep(1)
+        raise RuntimeError(f'{mode} server did not start on port {port}')
+
+    try:
+        asyncio.run(wait_ready(time.time() + 180))
+    except Exception:
+        process.terminate()
+        raise
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Slow-upload benchmark for sync vs async serving')
+    parser.add_argument('--url', help='Benchmark an already running server')
+    parser.add_argument('--compare', action='store_true', help='Start sync and async servers and compare them')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes for --compare')
+    parser.add_argument('--port', type=int, default=5099, help='Port for servers started by --compare')
+    parser.add_argument('--uploads', type=int, default=50, help='Concurrent slow uploads')
+    parser.add_argument('--rows', type=int, default=500, help='CSV rows per upload')
+    parser.add_argument('--chunk-bytes', type=int, default=1024, help='Bytes sent per write')
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between writes')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+    if not args.url and not args.compare:
+        parser.error('pass --url or --compare')
+
+    scenario = (args.uploads, args.rows, args.chunk_bytes, args.interval, args.timeout)
+    results = {}
+    if args.url:
+        results['target'] = asyncio.run(run_scenario(args.url, *scenario))
+    else:
+        for mode in ('sync', 'async'):
+            print(f"⏳ Starting {mode} server with {args.workers} workers...")
+            process = start_server(mode, args.port, args.workers)
+            try:
+                results[mode] = asyncio.run(run_scenario(f'http://127.0.0.1:{args.port}', *scenario))
+            finally:
+                process.terminate()
+                process.wait()
+
+    for name, result in results.items():
+        print(f"\n{name}: {result['uploads_ok']}/{result['uploads']} uploads ok in {result['wall_seconds']:.1f}s")
+        print(f"  health probe: {result['probe_requests']} requests, {result['probe_failures']} failed, "
+              f"p50 {result['probe_ms_p50'] or float('nan'):.1f} ms, p99 {result['probe_ms_p99'] or float('nan'):.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare inference throughput of the old worker formula with the CPU planner's plan
+
+Each configuration starts the given number of worker processes at once,
+as gunicorn would, and every worker scores batches in a closed loop for a
+fixed time. The old formula runs ``2 x cpu_count + 1`` workers, each with
+TensorFlow's and BLAS's default thread pools (about ``cpu_count`` threads
+apiece); the plan from :mod:`cpu_planner` sizes workers and threads
+together. Batch size 1 matches ``/api/predict`` traffic, larger batches
+match validation and batch scoring.
+
+Usage:
+    python bench_cpu_plan.py [--duration 20] [--batch-sizes 1,1024] [--mode sync] [--pin]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from cpu_planner import THREAD_ENV_VARS, apply_plan, available_cpus, make_plan
+from model_bundle import DATASET_PATH, MODEL_PATH
+
+
+def _worker(index, bundle_path, dataset_path, batch_size, duration, plan, barrier, results):
+    import tensorflow as tf
+    from cpu_planner import configure_tensorflow, pin_worker
+    from model_bundle import ModelBundle
+    configure_tensorflow(tf)
+    if plan and plan['pinning']:
+        pin_worker(index, plan)
+
+    bundle = ModelBundle.load(bundle_path, dataset_path)
+    X = np.random.default_rng(index).random((batch_size, len(bundle.features)))
+    bundle.predict_proba(X, batch_size)  # Warm up before the clock starts
+
+    barrier.wait()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        bundle.predict_proba(X, batch_size)
+        latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+def run_config(workers, plan, batch_size, duration, bundle_path, dataset_path):
+    """Rows per second and per-call latency of ``workers`` concurrent processes"""
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(i, bundle_path, dataset_path, batch_size, duration,
+                                                       plan, barrier, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    latencies = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    calls = np.concatenate([np.asarray(l) for l in latencies])
+    return {
+        'workers': workers,
+        'batch_size': batch_size,
+        'calls': int(len(calls)),
+        'rows_per_second': float(len(calls) * batch_size / duration),
+        'latency_ms_p50': float(np.percentile(calls, 50) * 1000),
+        'latency_ms_p99': float(np.percentile(calls, 99) * 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of the old worker formula vs the CPU planner')
+    parser.add_argument('--bundle', default=MODEL_PATH, help='Model bundle directory or .h5 model file')
+    parser.add_argument('--dataset', default=DATASET_PATH, help='Training dataset for a bare model file')
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync', help='Server mode to plan for')
+    parser.add_argument('--batch-sizes', default='1,1024', help='Comma-separated rows per call')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds each configuration runs')
+    parser.add_argument('--pin', action='store_true', help='Pin planned workers to CPUs')
+    parser.add_argument('--output', help='Write results as JSON')
+    args = parser.parse_args()
+
+    if args.pin:
+        os.environ['CPU_PINNING'] = '1'
+    plan = make_plan(args.mode)
+    legacy_workers = (os.cpu_count() or 1) * 2 + 1
+    print(f"🧮 os.cpu_count() = {os.cpu_count()}, usable CPUs = {available_cpus()}")
+
+    results = {'plan': plan, 'legacy': [], 'planned': []}
+    for batch_size in [int(b) for b in args.batch_sizes.split(',') if b]:
+        # Spawned workers inherit the environment at start, so set it per configuration
+        for name in THREAD_ENV_VARS + ('TF_NUM_INTEROP_THREADS',):
+            os.environ.pop(name, None)
+        print(f"⏳ Old formula: {legacy_workers} workers, default threads, batch {batch_size}...")
+        legacy = run_config(legacy_workers, None, batch_size, args.duration, args.bundle, args.dataset)
+        results['legacy'].append(legacy)
+
+        apply_plan(plan)
+        print(f"⏳ Planned: {plan['workers']} workers, batch {batch_size}...")
+        planned = run_config(plan['workers'], plan, batch_size, args.duration, args.bundle, args.dataset)
+        results['planned'].append(planned)
+
+        gain = planned['rows_per_second'] / legacy['rows_per_second'] if legacy['rows_per_second'] else float('nan')
+        print(f"\nbatch {batch_size}: {legacy['rows_per_second']:,.0f} -> {planned['rows_per_second']:,.0f} rows/s "
+              f"({gain:.2f}x), p99 {legacy['latency_ms_p99']:.1f} -> {planned['latency_ms_p99']:.1f} ms\n")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
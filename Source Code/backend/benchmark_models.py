@@ -0,0 +1,303 @@
+"""Reproducible accuracy / latency / memory / throughput benchmark of models
+
+Replaces the hand-typed comparison table in the notebook (cell 44). Every
+model is scored on the same stratified 20% test split of
+``selected_features_water_quality.csv`` (``random_state=42``), and each one
+runs in a fresh process so load time and resident memory are its own.
+
+Recorded per model: accuracy, weighted and macro F1 (with bootstrap
+intervals), p50/p99 single-row latency, rows per second at several batch
+sizes, load time, and RSS after loading and at peak.
+
+Usage:
+    python benchmark_models.py [--model GRU=../gru_water_quality.h5] [--train-baselines] \\
+        [--batch-sizes 1,32,256,2048] [--output benchmark.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_selection import ARTIFACT_DIR, file_digest, load_selected_features
+from model_bundle import DATASET_PATH, MODEL_PATH, TARGET, dataset_metadata
+
+BASELINE_DIR = os.path.join(ARTIFACT_DIR, 'benchmark_models')
+BATCH_SIZES = [1, 32, 256, 2048]
+LATENCY_CALLS = 200
+WARMUP_CALLS = 10
+THROUGHPUT_ROWS = 20000
+PACKAGES = ('numpy', 'pandas', 'scikit-learn', 'tensorflow-cpu', 'tensorflow')
+
+
+def rss_mb():
+    """Current resident set size from /proc, falling back to the peak"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_split(dataset_path, features, test_size=0.2, random_state=42):
+    """Scaled test split and its encoded labels, as used by every model"""
+    from sklearn.model_selection import train_test_split
+    meta = dataset_metadata(dataset_path, features)
+    df = pd.read_csv(dataset_path, usecols=list(features) + [TARGET]).dropna()
+    span = meta['data_max'] - meta['data_min']
+    span[span == 0] = 1.0
+    X = ((df[list(features)].to_numpy(dtype=np.float64) - meta['data_min']) / span).astype(np.float32)
+    y = np.searchsorted(meta['classes'], df[TARGET].astype(str).to_numpy())
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state,
+                                                        stratify=y)
+    return X_train, X_test, y_train, y_test, meta['classes']
+
+
+def load_predictor(path, call='predict'):
+    """``(kind, predict_proba)`` for a Keras file, a pickled sklearn model or a bundle directory"""
+    if os.path.isdir(path):
+        from model_bundle import ModelBundle
+        bundle = ModelBundle.load(path)
+        return f'bundle:{bundle.kind}', bundle.predict_proba
+    if path.endswith(('.pkl', '.joblib')):
+        import joblib
+        return 'sklearn', joblib.load(path).predict_proba
+
+    from model_bundle import load_keras
+    model = load_keras(path)
+    rank = len(model.input_shape)
+
+    def predict_proba(X):
+        X = X.reshape(len(X), 1, -1) if rank == 3 else X
+        if call == 'predict':
+            return model.predict(X, verbose=0)
+        return model(X, training=False).numpy()
+    return 'keras', predict_proba
+
+
+def _benchmark_model(args):
+    """Runs in its own process: load, evaluate, time and measure one model"""
+    name, path, options = args
+    import tensorflow as tf  # noqa: F401  (import cost is not part of the model's load time)
+    from metrics import evaluate
+
+    _, X_test, _, y_test, classes = load_split(options['dataset'], options['features'])
+    baseline_rss = rss_mb()
+
+    started = time.perf_counter()
+    kind, predict_proba = load_predictor(path, options['call'])
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    scores = evaluate(y_test, np.argmax(predict_proba(X_test), axis=1), classes, bootstrap=options['bootstrap'])
+
+    for i in range(WARMUP_CALLS):
+        predict_proba(X_test[i % len(X_test)][None, :])
+    latencies = []
+    for i in range(options['latency_calls']):
+        row = X_test[i % len(X_test)][None, :]
+        started = time.perf_counter()
+        predict_proba(row)
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000
+
+    throughput = {}
+    repeats = int(np.ceil(options['rows'] / len(X_test)))
+    X_big = np.tile(X_test, (repeats, 1))[:options['rows']]
+    for batch_size in options['batch_sizes']:
+        # Small batches are capped so single-row runs stay short
+        rows = min(len(X_big), batch_size * 200)
+        predict_proba(X_big[:batch_size])
+        started = time.perf_counter()
+        for start in range(0, rows, batch_size):
+            predict_proba(X_big[start:start + batch_size])
+        throughput[str(batch_size)] = rows / (time.perf_counter() - started)
+
+    return {
+        'name': name,
+        'path': path,
+        'kind': kind,
+        'model_digest': file_digest(path)[:16] if os.path.isfile(path) else None,
+        'accuracy': scores['accuracy'],
+        'f1_score': scores['f1_score'],
+        'macro_f1': scores['macro_f1'],
+        'confidence_intervals': scores.get('confidence_intervals'),
+        'test_samples': int(len(y_test)),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'latency_ms_mean': float(latencies.mean()),
+        'rows_per_second': throughput,
+        'load_seconds': load_seconds,
+        'rss_mb_before_load': baseline_rss,
+        'rss_mb_after_load': loaded_rss,
+        'model_rss_mb': loaded_rss - baseline_rss,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def train_baselines(dataset_path, features, output_dir=BASELINE_DIR, epochs=50, force=False):
+    """Train the notebook's Random Forest, FNN and LSTM on the benchmark's training split"""
+    import joblib
+    import tensorflow as tf
+    from sklearn.ensemble import RandomForestClassifier
+    from tensorflow.keras.layers import LSTM, Dense
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.utils import to_categorical
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        'RandomForest': os.path.join(output_dir, 'random_forest.joblib'),
+        'FNN': os.path.join(output_dir, 'fnn.h5'),
+        'LSTM': os.path.join(output_dir, 'lstm.h5'),
+    }
+    if not force and all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    X_train, _, y_train, _, classes = load_split(dataset_path, features)
+    tf.keras.utils.set_random_seed(42)
+    y_cat = to_categorical(y_train, num_classes=len(classes))
+
+    print("🚀 Training Random Forest...")
+    rf = RandomForestClassifier(n_estimators=150, max_depth=10, random_state=42, n_jobs=-1)
+    rf.fit(X_train, y_train)
+    joblib.dump(rf, paths['RandomForest'])
+
+    print("🚀 Training FNN...")
+    fnn = Sequential([
+        Dense(64, activation='relu', input_shape=(X_train.shape[1],)),
+        Dense(32, activation='relu'),
+        Dense(len(classes), activation='softmax')
+    ])
+    fnn.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    fnn.fit(X_train, y_cat, validation_split=0.2, epochs=epochs, batch_size=16, verbose=0)
+    fnn.save(paths['FNN'])
+
+    print("🚀 Training LSTM...")
+    lstm = Sequential([
+        LSTM(64, activation='tanh', input_shape=(1, X_train.shape[1])),
+        Dense(32, activation='relu'),
+        Dense(len(classes), activation='softmax')
+    ])
+    lstm.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    lstm.fit(X_train.reshape(len(X_train), 1, -1), y_cat, validation_split=0.2, epochs=epochs,
+             batch_size=16, verbose=0)
+    lstm.save(paths['LSTM'])
+    return paths
+
+
+def _train_baselines(args):
+    return train_baselines(*args)
+
+
+def environment():
+    from importlib import metadata
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+    }
+
+
+def run_benchmark(models, dataset_path=DATASET_PATH, batch_sizes=BATCH_SIZES, latency_calls=LATENCY_CALLS,
+                  rows=THROUGHPUT_ROWS, bootstrap=1000, call='predict'):
+    """Benchmark each ``(name, path)`` in a fresh process and return the report"""
+    options = {
+        'dataset': dataset_path,
+        'features': load_selected_features(),
+        'batch_sizes': list(batch_sizes),
+        'latency_calls': latency_calls,
+        'rows': rows,
+        'bootstrap': bootstrap,
+        'call': call,
+    }
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name, path in models:
+        print(f"⏳ Benchmarking {name} ({path})...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(_benchmark_model, (name, path, options)).result())
+    return {
+        'created': time.time(),
+        'environment': environment(),
+        'dataset': {'path': dataset_path, 'digest': file_digest(dataset_path)[:16], 'split': 'stratified 20% test',
+                    'random_state': 42, 'features': options['features']},
+        'settings': {k: v for k, v in options.items() if k not in ('dataset', 'features')},
+        'models': results,
+    }
+
+
+def format_table(report):
+    batch_sizes = report['settings']['batch_sizes']
+    header = ['Model', 'Accuracy', 'F1', 'p50 ms', 'p99 ms'] + [f'rows/s @{b}' for b in batch_sizes] + \
+             ['Load s', 'RSS MB']
+    lines = [' | '.join(header), ' | '.join('---' for _ in header)]
+    for m in report['models']:
+        row = [m['name'], f"{m['accuracy']:.4f}", f"{m['f1_score']:.4f}", f"{m['latency_ms_p50']:.2f}",
+               f"{m['latency_ms_p99']:.2f}"]
+        row += [f"{m['rows_per_second'][str(b)]:,.0f}" for b in batch_sizes]
+        row += [f"{m['load_seconds']:.2f}", f"{m['model_rss_mb']:.1f}"]
+        lines.append(' | '.join(row))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark model accuracy, latency, throughput and memory')
+    parser.add_argument('--model', action='append', default=[], metavar='NAME=PATH',
+                        help='Model to benchmark (.h5, .joblib/.pkl or bundle directory); repeatable')
+    parser.add_argument('--train-baselines', action='store_true',
+                        help='Also train and benchmark the notebook Random Forest, FNN and LSTM')
+    parser.add_argument('--retrain', action='store_true', help='Retrain baselines even if saved')
+    parser.add_argument('--epochs', type=int, default=50, help='Epochs for the FNN and LSTM baselines')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--batch-sizes', default=','.join(str(b) for b in BATCH_SIZES))
+    parser.add_argument('--latency-calls', type=int, default=LATENCY_CALLS, help='Single-row calls timed')
+    parser.add_argument('--rows', type=int, default=THROUGHPUT_ROWS, help='Rows scored per throughput run')
+    parser.add_argument('--bootstrap', type=int, default=1000, help='Bootstrap resamples for intervals')
+    parser.add_argument('--call', choices=['predict', 'direct'], default='predict',
+                        help="Keras entry point: model.predict (as served) or a direct model call")
+    parser.add_argument('--output', help='Write the full report as JSON')
+    args = parser.parse_args()
+
+    models = [tuple(spec.split('=', 1)) for spec in args.model] or [('GRU', MODEL_PATH)]
+    if args.train_baselines:
+        # Train in a child process so the parent never initialises TensorFlow
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            paths = pool.submit(_train_baselines, (args.dataset, load_selected_features(), BASELINE_DIR,
+                                                   args.epochs, args.retrain)).result()
+        models += list(paths.items())
+
+    report = run_benchmark(models, dataset_path=args.dataset,
+                           batch_sizes=[int(b) for b in args.batch_sizes.split(',') if b],
+                           latency_calls=args.latency_calls, rows=args.rows, bootstrap=args.bootstrap, call=args.call)
+    print()
+    print(format_table(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Choose worker count and per-process thread pools from the CPUs really available
+
+``cpu_count()`` reports every core on the host, not the container's cgroup
+quota or the affinity mask, and each worker's TensorFlow and BLAS runtimes
+start about ``cpu_count`` threads of their own. The plan keeps
+``workers x compute threads`` equal to the usable CPUs:
+
+- sync workers serve one request at a time, so one worker per CPU with
+  single-threaded kernels;
+- async workers run several requests at once, so half as many workers with
+  two compute threads each.
+
+``WORKERS`` and ``THREADS_PER_WORKER`` override the choice;
+``CPU_PINNING=1`` pins each worker to its own slice of the allowed CPUs.
+"""
+import math
+import os
+
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS')
+
+
+def cgroup_cpu_limit():
+    """CPU quota of this container as a fraction of CPUs, or None if unlimited"""
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def allowed_cpus():
+    """CPU ids this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def available_cpus():
+    """Usable CPUs: the affinity mask, capped by the cgroup quota"""
+    cpus = len(allowed_cpus())
+    quota = cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def make_plan(mode='sync', cpus=None):
+    """Worker count and per-worker compute threads for ``mode`` (sync or async)"""
+    cpus = cpus or available_cpus()
+    threads = os.environ.get('THREADS_PER_WORKER')
+    workers = os.environ.get('WORKERS')
+    if threads:
+        threads = max(1, int(threads))
+    else:
+        threads = 1 if mode == 'sync' else min(2, cpus)
+    if workers:
+        workers = max(1, int(workers))
+    else:
+        workers = max(1, cpus // threads)
+    return {
+        'mode': mode,
+        'cpus': cpus,
+        'cgroup_quota': cgroup_cpu_limit(),
+        'allowed_cpus': allowed_cpus(),
+        'workers': workers,
+        'intra_op_threads': threads,
+        'inter_op_threads': 1,
+        'blas_threads': threads,
+        'pinning': os.environ.get('CPU_PINNING', '0') == '1',
+    }
+
+
+def apply_plan(plan):
+    """Export thread counts so every worker's NumPy, BLAS and TensorFlow pick them up"""
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(plan['intra_op_threads'])
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(plan['inter_op_threads'])
+    print(f"🧮 CPU plan: {plan['cpus']} usable CPUs (quota {plan['cgroup_quota'] or 'none'}, "
+          f"{len(plan['allowed_cpus'])} in affinity mask) -> {plan['workers']} {plan['mode']} workers x "
+          f"{plan['intra_op_threads']} compute threads, inter-op {plan['inter_op_threads']}, "
+          f"pinning {'on' if plan['pinning'] else 'off'}")
+
+
+def configure_tensorflow(tf):
+    """Apply the exported thread counts; must run before TensorFlow executes any op"""
+    intra = os.environ.get('TF_NUM_INTRAOP_THREADS')
+    inter = os.environ.get('TF_NUM_INTEROP_THREADS')
+    try:
+        if intra:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra))
+        if inter:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter))
+    except RuntimeError as e:
+        # TensorFlow was already initialised in this process
+        print(f"⚠️ Could not set TensorFlow thread counts: {str(e)}")
+
+
+def pin_worker(index, plan):
+    """Pin worker ``index`` (0-based, wraps around) to its slice of the allowed CPUs"""
+    cpus = plan['allowed_cpus']
+    width = plan['intra_op_threads']
+    slots = max(1, len(cpus) // width)
+    start = (index % slots) * width
+    selected = set(cpus[start:start + width])
+    os.sched_setaffinity(0, selected)
+    return sorted(selected)
@@ -0,0 +1,139 @@
+"""Upload-once dataset sessions stored as memory-mapped Arrow files
+
+An uploaded file is parsed once and written as uncompressed Feather (Arrow
+IPC), which every worker can memory-map. Follow-up row, statistics and
+validation requests address the dataset by id instead of re-uploading it.
+Datasets idle for longer than the TTL are deleted.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from serialization import RawJSON
+
+DATASET_SESSION_DIR = os.environ.get('DATASET_SESSION_DIR', os.path.join('..', 'dataset_sessions'))
+DATASET_SESSION_TTL = float(os.environ.get('DATASET_SESSION_TTL', 3600))
+EVICTION_INTERVAL = 60
+
+
+class DatasetNotFound(KeyError):
+    pass
+
+
+class DatasetSessionStore:
+    """Directory of ``<id>/data.arrow`` files with JSON metadata"""
+
+    def __init__(self, root=DATASET_SESSION_DIR, ttl=DATASET_SESSION_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._last_eviction = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _dir(self, dataset_id):
+        # Ids are generated hex strings; reject anything that could escape the root
+        if not dataset_id or not all(c in '0123456789abcdef' for c in dataset_id):
+            raise DatasetNotFound(dataset_id)
+        return os.path.join(self.root, dataset_id)
+
+    def create(self, df, filename):
+        """Persist a parsed DataFrame and return its metadata"""
+        self.evict_expired()
+        dataset_id = uuid.uuid4().hex
+        tmp_dir = os.path.join(self.root, f'.{dataset_id}.tmp')
+        os.makedirs(tmp_dir)
+        df = df.reset_index(drop=True)
+        df.columns = [str(c) for c in df.columns]
+        df.to_feather(os.path.join(tmp_dir, 'data.arrow'), compression='uncompressed')
+        meta = {
+            'dataset_id': dataset_id,
+            'filename': filename,
+            'created': time.time(),
+            'rows': len(df),
+            'columns': df.columns.tolist(),
+            'dtypes': df.dtypes.astype(str).to_dict(),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp_dir, self._dir(dataset_id))
+        return dict(meta, expires_in=self.ttl)
+
+    def meta(self, dataset_id):
+        self.evict_expired()
+        path = os.path.join(self._dir(dataset_id), 'meta.json')
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                shutil.rmtree(self._dir(dataset_id), ignore_errors=True)
+                raise DatasetNotFound(dataset_id)
+            with open(path) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise DatasetNotFound(dataset_id)
+        # The meta file's mtime doubles as the last-access time for TTL eviction
+        os.utime(path)
+        return dict(meta, expires_in=self.ttl)
+
+    def table(self, dataset_id):
+        """Memory-mapped Arrow table; columns are paged in on first touch"""
+        import pyarrow.feather as feather
+        self.meta(dataset_id)
+        return feather.read_table(os.path.join(self._dir(dataset_id), 'data.arrow'), memory_map=True)
+
+    def frame(self, dataset_id, columns=None, start=0, stop=None):
+        """Rows ``start:stop`` of the selected columns as a DataFrame"""
+        table = self.table(dataset_id)
+        if columns:
+            missing = [c for c in columns if c not in table.column_names]
+            if missing:
+                raise ValueError(f'Unknown columns: {missing}')
+            table = table.select(columns)
+        stop = table.num_rows if stop is None else min(stop, table.num_rows)
+        start = max(0, min(start, stop))
+        return table.slice(start, stop - start).to_pandas()
+
+    def column_stats(self, dataset_id, columns=None):
+        """describe()-style statistics and missing counts per column"""
+        df = self.frame(dataset_id, columns=columns)
+        numeric = df.select_dtypes(include=[np.number])
+        return {
+            'rows': len(df),
+            'missing_values': RawJSON(df.isnull().sum().to_json()),
+            'description': RawJSON(numeric.describe().to_json() if len(numeric.columns) > 0 else '{}'),
+        }
+
+    def delete(self, dataset_id):
+        path = self._dir(dataset_id)
+        if not os.path.isdir(path):
+            raise DatasetNotFound(dataset_id)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def evict_expired(self, now=None):
+        """Delete datasets not accessed within the TTL; runs at most once a minute"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._last_eviction < EVICTION_INTERVAL:
+                return 0
+            self._last_eviction = now
+        evicted = 0
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, 'meta.json')
+            try:
+                idle = now - os.path.getmtime(meta_path)
+            except OSError:
+                # Half-written uploads from a crashed worker
+                path = os.path.join(self.root, name)
+                try:
+                    if name.startswith('.') and now - os.path.getmtime(path) > self.ttl:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+                continue
+            if idle > self.ttl:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+                evicted += 1
+        return evicted
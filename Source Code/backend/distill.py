@@ -0,0 +1,153 @@
+"""Distil the GRU into a small dense student for low-latency scoring
+
+The GRU (128 and 64 recurrent units) only ever sees a single timestep, so
+a narrow MLP can reproduce its decision surface. The student is trained on
+the GRU's soft probabilities rather than the hard labels, over the
+benchmark's training split plus augmented points:
+
+- jittered copies of training rows (Gaussian noise scaled per feature),
+- mixup blends of two random rows, covering the space between them,
+- uniform draws over the scaled feature box.
+
+The student is exported as an ``mlp`` bundle (NumPy weights, no TensorFlow
+needed to serve it) and reported on the held-out test split: agreement
+with the teacher, accuracy against the labels, and latency and throughput
+of both models from :mod:`benchmark_models`.
+
+Usage:
+    python distill.py [--teacher ../gru_water_quality.h5] [--output ../artifacts/student_bundle] \\
+        [--hidden 32] [--augment 10] [--epochs 60]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from feature_selection import ARTIFACT_DIR
+from model_bundle import DATASET_PATH, MODEL_PATH, STUDENT_PATH, ModelBundle, NumpyMLP
+
+REPORT_PATH = os.path.join(ARTIFACT_DIR, 'distill_report.json')
+JITTER_SCALE = 0.1
+
+
+def augment(X, factor, rng):
+    """``factor x len(X)`` synthetic rows: half jittered, a quarter mixup, a quarter uniform"""
+    n = int(len(X) * factor)
+    n_jitter, n_mixup = n // 2, n // 4
+    n_uniform = n - n_jitter - n_mixup
+    std = X.std(axis=0)
+
+    rows = rng.integers(0, len(X), n_jitter)
+    jitter = X[rows] + rng.normal(0, 1, (n_jitter, X.shape[1])) * std * JITTER_SCALE
+
+    a, b = rng.integers(0, len(X), n_mixup), rng.integers(0, len(X), n_mixup)
+    weight = rng.random((n_mixup, 1))
+    mixup = weight * X[a] + (1 - weight) * X[b]
+
+    uniform = rng.random((n_uniform, X.shape[1]))
+    return np.clip(np.vstack([jitter, mixup, uniform]), 0, 1).astype(np.float32)
+
+
+def train_student(X, soft_targets, hidden, epochs, batch_size=256, seed=42):
+    """Fit a ReLU MLP to the teacher's probabilities and return it as a :class:`NumpyMLP`"""
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.models import Sequential
+
+    tf.keras.utils.set_random_seed(seed)
+    layers = [Dense(units, activation='relu') for units in hidden]
+    student = Sequential([tf.keras.Input(shape=(X.shape[1],))] + layers +
+                         [Dense(soft_targets.shape[1], activation='softmax')])
+    # Cross-entropy against soft targets is KL divergence to the teacher plus a constant
+    student.compile(optimizer=tf.keras.optimizers.Adam(0.003), loss='categorical_crossentropy')
+    student.fit(X, soft_targets, epochs=epochs, batch_size=batch_size, validation_split=0.1, verbose=0,
+                callbacks=[EarlyStopping(patience=8, restore_best_weights=True)])
+    return NumpyMLP.from_keras(student)
+
+
+def agreement(teacher_proba, student_proba, y_true):
+    """How closely the student tracks the teacher, and both models' accuracy"""
+    teacher_pred = teacher_proba.argmax(axis=1)
+    student_pred = student_proba.argmax(axis=1)
+    eps = 1e-7
+    kl = (teacher_proba * (np.log(teacher_proba + eps) - np.log(student_proba + eps))).sum(axis=1)
+    return {
+        'top1_agreement': float((teacher_pred == student_pred).mean()),
+        'mean_kl_divergence': float(kl.mean()),
+        'max_probability_gap': float(np.abs(teacher_proba - student_proba).max()),
+        'teacher_accuracy': float((teacher_pred == y_true).mean()),
+        'student_accuracy': float((student_pred == y_true).mean()),
+        'test_samples': int(len(y_true)),
+    }
+
+
+def distill(teacher_path=MODEL_PATH, output_dir=STUDENT_PATH, dataset_path=DATASET_PATH, hidden=(32,),
+            augment_factor=10, epochs=60, seed=42):
+    """Train and save the student bundle; returns its agreement report"""
+    from benchmark_models import load_split
+
+    started = time.time()
+    teacher = ModelBundle.load(teacher_path, dataset_path)
+    X_train, X_test, _, y_test, _ = load_split(dataset_path, teacher.features)
+    rng = np.random.default_rng(seed)
+    X_fit = np.vstack([X_train, augment(X_train, augment_factor, rng)])
+    print(f"⏳ Labelling {len(X_fit):,} rows ({len(X_train):,} training + augmented) with the teacher...")
+    soft_targets = teacher.predict_proba(X_fit, batch_size=4096)
+
+    print(f"🚀 Training {'-'.join(str(h) for h in hidden)} student for up to {epochs} epochs...")
+    student_model = train_student(X_fit, soft_targets, hidden, epochs, seed=seed)
+    report = agreement(teacher.predict_proba(X_test), student_model.predict(X_test), y_test)
+    report.update({
+        'teacher_version': teacher.version,
+        'hidden_units': list(hidden),
+        'parameters': int(sum(w.size for w in student_model.get_weights())),
+        'training_rows': int(len(X_fit)),
+        'augment_factor': augment_factor,
+        'seconds': time.time() - started,
+    })
+
+    student = ModelBundle(student_model, teacher.features, teacher.data_min, teacher.data_max,
+                          teacher.fill_values, teacher.classes, f"student-{teacher.version}", kind='mlp')
+    student.save(output_dir, extra={'distillation': report})
+    print(f"✅ Student saved to {output_dir}: {report['top1_agreement']:.2%} agreement with the teacher, "
+          f"{report['parameters']:,} parameters")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Distil the GRU into a small MLP student bundle')
+    parser.add_argument('--teacher', default=MODEL_PATH, help='Teacher bundle directory or .h5 model file')
+    parser.add_argument('--output', default=STUDENT_PATH, help='Student bundle directory')
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--hidden', default='32', help='Comma-separated hidden layer widths')
+    parser.add_argument('--augment', type=float, default=10, help='Augmented rows per training row')
+    parser.add_argument('--epochs', type=int, default=60)
+    parser.add_argument('--skip-benchmark', action='store_true', help='Do not time teacher and student')
+    parser.add_argument('--report', default=REPORT_PATH, help='Write agreement and benchmark results as JSON')
+    args = parser.parse_args()
+
+    hidden = tuple(int(h) for h in args.hidden.split(',') if h)
+    report = {'agreement': distill(args.teacher, args.output, args.dataset, hidden, args.augment, args.epochs)}
+    print(json.dumps(report['agreement'], indent=2))
+
+    if not args.skip_benchmark:
+        from benchmark_models import format_table, run_benchmark
+        report['benchmark'] = run_benchmark([('GRU teacher', args.teacher), ('MLP student', args.output)],
+                                            dataset_path=args.dataset)
+        print()
+        print(format_table(report['benchmark']))
+        teacher_ms, student_ms = (m['latency_ms_p50'] for m in report['benchmark']['models'])
+        print(f"\n📈 Single-row p50 latency: {teacher_ms:.2f} ms -> {student_ms:.3f} ms "
+              f"({teacher_ms / student_ms:.0f}x faster)")
+
+    os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved to: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
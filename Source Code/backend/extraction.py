@@ -0,0 +1,132 @@
+"""Streaming PCA and k-means features (PC1, PC2, Cluster)
+
+The notebook fits ``PCA(n_components=2)`` and ``KMeans(n_clusters=4)`` on the
+whole frame. Here both are fitted chunk by chunk with ``IncrementalPCA`` and
+``MiniBatchKMeans``; only the projection matrix and centroids are persisted,
+so serving needs one matrix multiply and a nearest-centroid lookup.
+"""
+import os
+
+import numpy as np
+
+from feature_selection import ARTIFACT_DIR
+
+EXTRACTOR_PATH = os.environ.get('EXTRACTOR_PATH', os.path.join(ARTIFACT_DIR, 'feature_extractor.npz'))
+EXTRACTED_COLUMNS = ['PC1', 'PC2', 'Cluster']
+
+
+def fit_extractor(chunks, features, n_components=2, n_clusters=4, random_state=42):
+    """Fit incremental PCA and mini-batch k-means over an iterator of DataFrames"""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.decomposition import IncrementalPCA
+
+    pca = IncrementalPCA(n_components=n_components)
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state)
+    # partial_fit needs at least as many rows as components / clusters
+    min_rows = max(n_components, n_clusters)
+    pending = []
+    pending_rows = 0
+    rows = 0
+    for chunk in chunks:
+        X = chunk[features].to_numpy(dtype=np.float64)
+        if len(X) == 0:
+            continue
+        pending.append(X)
+        pending_rows += len(X)
+        if pending_rows < min_rows:
+            continue
+        X = np.vstack(pending)
+        pca.partial_fit(X)
+        kmeans.partial_fit(X)
+        rows += len(X)
+        pending, pending_rows = [], 0
+    if pending and rows:
+        X = np.vstack(pending)
+        if len(X) >= n_components:
+            pca.partial_fit(X)
+        kmeans.partial_fit(X)
+        rows += len(X)
+    if rows == 0:
+        raise ValueError(f"Need at least {min_rows} rows to fit PCA and k-means")
+
+    return FeatureExtractor(features, pca.mean_, pca.components_, kmeans.cluster_centers_,
+                            explained_variance_ratio=pca.explained_variance_ratio_)
+
+
+class FeatureExtractor:
+    """Serving-side PCA projection and nearest-centroid cluster assignment"""
+
+    def __init__(self, features, mean, components, centroids, explained_variance_ratio=None,
+                 data_min=None, data_max=None):
+        self.features = list(features)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.components = np.asarray(components, dtype=np.float64)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.centroid_norms = (self.centroids ** 2).sum(axis=1)
+        self.explained_variance_ratio = explained_variance_ratio
+        self.data_min = None if data_min is None else np.asarray(data_min, dtype=np.float64)
+        self.data_max = None if data_max is None else np.asarray(data_max, dtype=np.float64)
+
+    def scale(self, X):
+        """Apply the pipeline's min-max scaling to raw feature values"""
+        if self.data_min is None:
+            return X
+        span = self.data_max - self.data_min
+        span[span == 0] = 1.0
+        return (X - self.data_min) / span
+
+    def transform(self, X, raw=False):
+        """Return ``(components, clusters)`` for rows ordered like ``self.features``"""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.features))
+        if raw:
+            X = self.scale(X)
+        components = (X - self.mean) @ self.components.T
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 does not change the argmin
+        clusters = np.argmin(self.centroid_norms - 2.0 * X @ self.centroids.T, axis=1)
+        return components, clusters
+
+    def transform_frame(self, df, raw=False):
+        """Copy of ``df`` with PC1, PC2 and Cluster columns added"""
+        components, clusters = self.transform(df[self.features].to_numpy(dtype=np.float64), raw=raw)
+        out = df.copy()
+        for i in range(components.shape[1]):
+            out[f'PC{i + 1}'] = components[:, i]
+        out['Cluster'] = clusters
+        return out
+
+    def save(self, path=EXTRACTOR_PATH):
+        arrays = {
+            'features': np.array(self.features),
+            'mean': self.mean,
+            'components': self.components,
+            'centroids': self.centroids,
+        }
+        if self.explained_variance_ratio is not None:
+            arrays['explained_variance_ratio'] = self.explained_variance_ratio
+        if self.data_min is not None:
+            arrays['data_min'] = self.data_min
+            arrays['data_max'] = self.data_max
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=EXTRACTOR_PATH):
+        with np.load(path) as data:
+            return cls(
+                data['features'].tolist(), data['mean'], data['components'], data['centroids'],
+                explained_variance_ratio=data['explained_variance_ratio'] if 'explained_variance_ratio' in data else None,
+                data_min=data['data_min'] if 'data_min' in data else None,
+                data_max=data['data_max'] if 'data_max' in data else None,
+            )
+
+    def describe(self):
+        return {
+            'features': self.features,
+            'n_components': int(self.components.shape[0]),
+            'n_clusters': int(self.centroids.shape[0]),
+            'explained_variance_ratio': None if self.explained_variance_ratio is None
+            else [float(v) for v in self.explained_variance_ratio],
+            'accepts_raw': self.data_min is not None,
+        }
@@ -0,0 +1,194 @@
+"""Cached Random Forest feature selection stage
+
+Trains a Random Forest on all cores, keeps the features above the median
+importance (as in the notebook) and persists the selection as a JSON artifact
+keyed on the input data hash and parameters, so unchanged reruns are instant.
+
+Usage:
+    python feature_selection.py extracted_features_water_quality.csv \\
+        [--permutation] [--output selected_features_water_quality.csv]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', os.path.join('..', 'artifacts'))
+LATEST_SELECTION_PATH = os.path.join(ARTIFACT_DIR, 'selected_features.json')
+# The server only uses a selection it is explicitly pointed at, never the latest run
+SELECTED_FEATURES_PATH = os.environ.get('FEATURE_SELECTION_PATH')
+DEFAULT_FEATURES = ['hardness', 'solids', 'chloramines', 'conductivity',
+                    'organic_carbon', 'trihalomethanes', 'organic_load_index', 'ph_squared']
+EXCLUDED_COLUMNS = ('PSI', 'PSI_Level', 'Cluster')
+VERSION = 1
+
+
+def default_params():
+    return {
+        'target': 'PSI_Level',
+        'exclude': list(EXCLUDED_COLUMNS),
+        'n_estimators': 100,
+        'threshold': 'median',
+        'test_size': 0.2,
+        'random_state': 42,
+        'permutation': False,
+        'permutation_repeats': 5,
+    }
+
+
+def file_digest(path, block_size=16 * 1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def frame_digest(df):
+    """Content hash of a DataFrame, independent of how it was loaded"""
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def cache_key(data_hash, params):
+    payload = json.dumps({'data': data_hash, 'params': params, 'version': VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def artifact_path(key, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, 'feature_selection', f'{key}.json')
+
+
+def run_selection(df, params, n_jobs=-1):
+    """Fit the forest and return the selection artifact"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.feature_selection import SelectFromModel
+    from sklearn.inspection import permutation_importance
+    from sklearn.model_selection import train_test_split
+
+    X = df.drop(columns=list(params['exclude']), errors='ignore')
+    y = df[params['target']].astype('category').cat.codes
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, stratify=y, test_size=params['test_size'], random_state=params['random_state']
+    )
+
+    rf = RandomForestClassifier(n_estimators=params['n_estimators'],
+                                random_state=params['random_state'], n_jobs=n_jobs)
+    rf.fit(X_train, y_train)
+    selector = SelectFromModel(rf, threshold=params['threshold'], prefit=True)
+    selected = X.columns[selector.get_support()].tolist()
+
+    importances = pd.Series(rf.feature_importances_, index=X.columns).sort_values(ascending=False)
+    artifact = {
+        'selected_features': selected,
+        'importances': {k: float(v) for k, v in importances.items()},
+        'test_accuracy': float(rf.score(X_test, y_test)),
+        'params': params,
+    }
+
+    if params['permutation']:
+        result = permutation_importance(rf, X_test, y_test, n_repeats=params['permutation_repeats'],
+                                        random_state=params['random_state'], n_jobs=n_jobs)
+        artifact['permutation_importances'] = {
+            column: {'mean': float(m), 'std': float(s)}
+            for column, m, s in zip(X.columns, result.importances_mean, result.importances_std)
+        }
+    return artifact
+
+
+def select_features(df=None, path=None, params=None, artifact_dir=ARTIFACT_DIR, n_jobs=-1, force=False):
+    """Return the cached selection for this data and params, computing it if needed
+
+    Pass either a DataFrame or a CSV ``path``; for a path the raw file bytes
+    are hashed before parsing so a cache hit never reads the CSV.
+    """
+    params = dict(default_params(), **(params or {}))
+    data_hash = file_digest(path) if path is not None else frame_digest(df)
+    key = cache_key(data_hash, params)
+    cached = artifact_path(key, artifact_dir)
+
+    if os.path.exists(cached) and not force:
+        with open(cached) as f:
+            artifact = json.load(f)
+        artifact['cache_hit'] = True
+    else:
+        if df is None:
+            df = pd.read_csv(path)
+        started = time.time()
+        artifact = run_selection(df, params, n_jobs=n_jobs)
+        artifact.update({'key': key, 'data_hash': data_hash, 'seconds': time.time() - started})
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        _write_json(cached, artifact)
+        artifact['cache_hit'] = False
+
+    # Record the latest selection; the server adopts it only via FEATURE_SELECTION_PATH
+    _write_json(os.path.join(artifact_dir, 'selected_features.json'),
+                {k: v for k, v in artifact.items() if k != 'cache_hit'})
+    return artifact
+
+
+def _write_json(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_selected_features(path=SELECTED_FEATURES_PATH, default=DEFAULT_FEATURES):
+    """Feature list from the configured selection artifact, or the shipped default"""
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                return list(json.load(f)['selected_features'])
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable feature selection artifact: {str(e)}")
+    return list(default)
+
+
+def check_features(features, columns=None, n_inputs=None, default=DEFAULT_FEATURES):
+    """``features`` if the training data has all of them and the model takes that many, else ``default``"""
+    problems = []
+    if columns is not None:
+        missing = [f for f in features if f not in set(columns)]
+        if missing:
+            problems.append(f'missing from the training data: {missing}')
+    if n_inputs is not None and len(features) != n_inputs:
+        problems.append(f'the model expects {n_inputs} features, the selection has {len(features)}')
+    if problems and list(features) != list(default):
+        print(f"⚠️ Ignoring feature selection ({'; '.join(problems)}); using the built-in features")
+        return list(default)
+    return list(features)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cached Random Forest feature selection')
+    parser.add_argument('input', help='Extracted feature CSV containing the PSI_Level target')
+    parser.add_argument('--output', help='Also write the selected features and target to this CSV')
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--threshold', default='median')
+    parser.add_argument('--permutation', action='store_true', help='Also compute permutation importances')
+    parser.add_argument('--jobs', type=int, default=-1, help='Cores to use (default: all)')
+    parser.add_argument('--force', action='store_true', help='Ignore the cache')
+    parser.add_argument('--artifact-dir', default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    params = {'n_estimators': args.n_estimators, 'threshold': args.threshold, 'permutation': args.permutation}
+    artifact = select_features(path=args.input, params=params, artifact_dir=args.artifact_dir,
+                               n_jobs=args.jobs, force=args.force)
+    source = 'cache' if artifact['cache_hit'] else f"{artifact['seconds']:.2f}s"
+    print(f"✅ Selected {len(artifact['selected_features'])} features ({source}):")
+    print(artifact['selected_features'])
+
+    if args.output:
+        df = pd.read_csv(args.input)
+        df[artifact['selected_features'] + [artifact['params']['target']]].to_csv(args.output, index=False)
+        print(f"✅ Saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
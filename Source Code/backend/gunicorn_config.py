@@ -1,12 +1,28 @@
-import multiprocessing
 import os
 
+from cpu_planner import apply_plan, make_plan, pin_worker
+
 # Server socket
 bind = '0.0.0.0:' + str(os.environ.get('PORT', 5000))
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# SERVER_MODE=async serves asgi:app on uvicorn workers: request I/O runs on an
+# event loop and inference on a thread pool. Worker and thread counts come
+# from the CPUs this container may actually use, see cpu_planner.py.
+# The app is chosen here, so start gunicorn without a positional app argument
+# (one on the command line would override wsgi_app).
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync')
+CPU_PLAN = make_plan(SERVER_MODE)
+apply_plan(CPU_PLAN)
+workers = CPU_PLAN['workers']
+if SERVER_MODE == 'async':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'asgi:app'
+else:
+    worker_class = 'sync'
+    wsgi_app = 'app:app'
+    print("⚠️ Sync workers serve one request each from a shared accept queue: admission lanes, load "
+          "shedding and streaming ingestion need SERVER_MODE=async; only body size limits apply")
 worker_connections = 1000
 
 # Timeouts
@@ -26,3 +42,35 @@ errorlog = '-'  # Log to stdout
 loglevel = 'info'
 accesslog = '-'  # Log to stdout
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+
+def pre_fork(server, worker):
+    if CPU_PLAN['pinning']:
+        # Give a new or respawned worker the lowest CPU slice no live worker holds
+        taken = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+        worker.cpu_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    # Read by streaming.create_state_store: several workers must share station state
+    os.environ['SERVER_WORKERS'] = str(server.cfg.workers)
+    if CPU_PLAN['pinning']:
+        cpus = pin_worker(worker.cpu_slot, CPU_PLAN)
+        server.log.info(f"Worker {worker.pid} pinned to CPUs {cpus}")
+
+
+def on_exit(server):
+    # Workers leave the shared prediction cache segment in place for each other; drop it with the master
+    from prediction_cache import PREDICTION_CACHE, unlink_shared_cache
+    if PREDICTION_CACHE == 'shared' and unlink_shared_cache():
+        server.log.info("Removed shared prediction cache segment")
+
+
+def post_worker_init(worker):
+    # Sync workers import app:app without calling load_model() (the async app loads it in
+    # its lifespan hook). Load in the background so the worker answers /api/ready with 503
+    # meanwhile instead of being killed by the boot timeout.
+    if SERVER_MODE != 'async':
+        import threading
+        from app import load_model
+        threading.Thread(target=load_model, name='load-model', daemon=True).start()
@@ -0,0 +1,247 @@
+"""Embedded SQLite store for scored readings and validation results"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', os.path.join('..', 'predictions.db'))
+HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 500))
+HISTORY_FLUSH_SECONDS = float(os.environ.get('HISTORY_FLUSH_SECONDS', 1.0))
+HISTORY_QUEUE_SIZE = int(os.environ.get('HISTORY_QUEUE_SIZE', 100000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    station TEXT NOT NULL,
+    source TEXT NOT NULL,
+    predicted_class TEXT NOT NULL,
+    confidence REAL,
+    features TEXT,
+    probabilities TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions (ts);
+CREATE INDEX IF NOT EXISTS idx_predictions_station_ts ON predictions (station, ts);
+
+-- Rolled up at insert time so hourly queries never touch the raw rows
+CREATE TABLE IF NOT EXISTS hourly_counts (
+    hour INTEGER NOT NULL,
+    station TEXT NOT NULL,
+    predicted_class TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, station, predicted_class)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS validations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    results TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_validations_ts ON validations (ts);
+"""
+
+UPSERT_HOURLY = """
+INSERT INTO hourly_counts (hour, station, predicted_class, count) VALUES (?, ?, ?, ?)
+ON CONFLICT (hour, station, predicted_class) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def to_epoch(timestamp):
+    """Convert an epoch number or ISO-8601 string to epoch seconds; raises ValueError otherwise"""
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return float(timestamp)
+    if not isinstance(timestamp, str):
+        raise ValueError(f'Invalid timestamp: {timestamp!r}')
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f'Invalid timestamp: {timestamp!r}') from None
+
+
+def connect(path=HISTORY_DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class PredictionStore:
+    """Batches writes on a background thread so scoring never waits on disk"""
+
+    def __init__(self, path=HISTORY_DB_PATH, batch_size=HISTORY_BATCH_SIZE,
+                 flush_seconds=HISTORY_FLUSH_SECONDS, queue_size=HISTORY_QUEUE_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._writer = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        with connect(self.path) as conn:
+            conn.executescript(SCHEMA)
+        conn.close()
+
+    def _ensure_writer(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid() or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                self._pid = os.getpid()
+                self._writer.start()
+
+    def _put(self, item):
+        self._ensure_writer()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_predictions(self, rows, source='predict'):
+        """Queue scored rows of (timestamp, station, class, confidence, features, probabilities)
+
+        Rows that cannot be converted are counted as dropped; the request
+        that produced them has already been answered.
+        """
+        for ts, station, predicted_class, confidence, features, probabilities in rows:
+            try:
+                row = (
+                    to_epoch(ts), str(station) if station is not None else '', source,
+                    str(predicted_class), float(confidence),
+                    json.dumps([float(v) for v in features]),
+                    json.dumps({str(k): float(v) for k, v in probabilities.items()}),
+                )
+            except (TypeError, ValueError) as e:
+                self.dropped += 1
+                print(f"⚠️ Not recording prediction: {str(e)}")
+                continue
+            self._put(('prediction', row))
+
+    def record_validation(self, results, source='validate'):
+        self._put(('validation', (time.time(), source, json.dumps(results))))
+
+    def _run(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                print(f"❌ Error writing prediction history: {str(e)}")
+
+    def _write(self, conn, batch):
+        predictions = [row for kind, row in batch if kind == 'prediction']
+        validations = [row for kind, row in batch if kind == 'validation']
+
+        hourly = {}
+        for ts, station, _, predicted_class, *_ in predictions:
+            key = (int(ts // 3600) * 3600, station, predicted_class)
+            hourly[key] = hourly.get(key, 0) + 1
+
+        with conn:
+            conn.executemany(
+                'INSERT INTO predictions (ts, station, source, predicted_class, confidence, features, probabilities) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', predictions)
+            conn.executemany(UPSERT_HOURLY, [key + (count,) for key, count in hourly.items()])
+            conn.executemany('INSERT INTO validations (ts, source, results) VALUES (?, ?, ?)', validations)
+        self.written += len(batch)
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'queued': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+        }
+
+    def query_predictions(self, station=None, start=None, end=None, limit=1000):
+        """Most recent predictions in a time range, optionally for one station"""
+        clauses, params = [], []
+        if station is not None:
+            clauses.append('station = ?')
+            params.append(station)
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(to_epoch(start))
+        if end is not None:
+            clauses.append('ts < ?')
+            params.append(to_epoch(end))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = connect(self.path)
+        try:
+            rows = conn.execute(
+                'SELECT ts, station, source, predicted_class, confidence, features, probabilities '
+                f'FROM predictions {where} ORDER BY ts DESC LIMIT ?', params + [int(limit)]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{
+            'timestamp': ts,
+            'station_id': station_id,
+            'source': source,
+            'predicted_class': predicted_class,
+            'confidence': confidence,
+            'features': json.loads(features),
+            'probabilities': json.loads(probabilities),
+        } for ts, station_id, source, predicted_class, confidence, features, probabilities in rows]
+
+    def hourly_class_counts(self, station=None, start=None, end=None):
+        """Class counts per hour read from the rollup table"""
+        clauses, params = [], []
+        if station is not None:
+            clauses.append('station = ?')
+            params.append(station)
+        if start is not None:
+            clauses.append('hour >= ?')
+            params.append(int(to_epoch(start) // 3600) * 3600)
+        if end is not None:
+            clauses.append('hour < ?')
+            params.append(to_epoch(end))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = connect(self.path)
+        try:
+            rows = conn.execute(
+                f'SELECT hour, predicted_class, SUM(count) FROM hourly_counts {where} '
+                'GROUP BY hour, predicted_class ORDER BY hour', params
+            ).fetchall()
+        finally:
+            conn.close()
+
+        hours = {}
+        for hour, predicted_class, count in rows:
+            hours.setdefault(hour, {})[predicted_class] = count
+        return [{
+            'hour': datetime.utcfromtimestamp(hour).isoformat() + 'Z',
+            'counts': counts,
+            'total': sum(counts.values()),
+        } for hour, counts in hours.items()]
+
+    def recent_validations(self, limit=20):
+        conn = connect(self.path)
+        try:
+            rows = conn.execute(
+                'SELECT ts, source, results FROM validations ORDER BY ts DESC LIMIT ?', (int(limit),)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{'timestamp': ts, 'source': source, 'results': json.loads(results)}
+                for ts, source, results in rows]
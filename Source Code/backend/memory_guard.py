@@ -0,0 +1,173 @@
+"""Per-request memory accounting and an upload memory guard
+
+Peak memory per request comes from the kernel's high-water mark (``VmHWM``
+in ``/proc/self/status``), reset at the start of each request by writing 5
+to ``/proc/self/clear_refs``. With a sync worker this is exactly the
+request's peak; when requests overlap in one process the peak is shared
+and such samples are flagged.
+
+Before an upload is parsed, its in-memory cost is estimated from its size
+and the column count and line length sniffed from the first bytes. Uploads
+over ``MEMORY_BUDGET_MB`` are sent to a streaming path where the endpoint
+has one, or rejected with 413.
+"""
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+MB = 1024 * 1024
+MEMORY_BUDGET_MB = float(os.environ.get('MEMORY_BUDGET_MB', 1024))
+MEMORY_LOG_MB = float(os.environ.get('MEMORY_LOG_MB', 100))
+STREAM_CHUNK_ROWS = int(os.environ.get('MEMORY_STREAM_CHUNK_ROWS', 50000))
+
+# Float64 frames alive at once while validating: the parsed frame, the
+# fillna copy, the scaled array and the train/test split
+FRAME_COPIES = 4
+# openpyxl holds every cell as a Python object, many times the compressed .xlsx size
+EXCEL_EXPANSION = 25
+SAMPLE_BYTES = 64 * 1024
+SAMPLES_PER_ENDPOINT = 500
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, plan):
+        super().__init__(f"Parsing this upload would need about {plan['estimated_mb']:.0f} MB; "
+                         f"the limit is {plan['budget_mb']:.0f} MB")
+        self.plan = plan
+
+
+def _proc_status(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes():
+    return _proc_status('VmRSS')
+
+
+def peak_rss_bytes():
+    return _proc_status('VmHWM')
+
+
+def reset_peak():
+    """Reset the process's RSS high-water mark (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class MemoryTracker:
+    """Peak RSS growth per request, aggregated per endpoint"""
+
+    def __init__(self, log_bytes=MEMORY_LOG_MB * MB):
+        self.log_bytes = log_bytes
+        self.samples = {}
+        self.shared_samples = 0
+        self.peak_reset_supported = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._in_flight += 1
+            exclusive = self._in_flight == 1
+            if exclusive:
+                self.peak_reset_supported = reset_peak()
+        return {'rss': rss_bytes(), 'exclusive': exclusive}
+
+    def finish(self, token, endpoint):
+        """Record and return the request's peak RSS above its starting RSS"""
+        peak, start = peak_rss_bytes(), token['rss']
+        used = max(0, peak - start) if peak is not None and start is not None else 0
+        with self._lock:
+            exclusive = token['exclusive'] and self._in_flight == 1
+            self._in_flight -= 1
+            self.samples.setdefault(endpoint, deque(maxlen=SAMPLES_PER_ENDPOINT)).append(used)
+            if not exclusive:
+                self.shared_samples += 1
+        return used
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, samples in self.samples.items():
+                values = np.array(samples, dtype=np.float64) / MB
+                endpoints[endpoint] = {
+                    'requests': len(values),
+                    'mean_mb': float(values.mean()),
+                    'p95_mb': float(np.percentile(values, 95)),
+                    'max_mb': float(values.max()),
+                }
+            return {
+                'rss_mb': (rss_bytes() or 0) / MB,
+                'peak_rss_mb': (peak_rss_bytes() or 0) / MB,
+                'peak_reset_supported': self.peak_reset_supported,
+                'shared_samples': self.shared_samples,
+                'endpoints': endpoints,
+            }
+
+
+def upload_size(file):
+    """Size of an uploaded file without reading it (werkzeug spools large uploads to disk)"""
+    stream = file.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def sniff_csv(file, sample_bytes=SAMPLE_BYTES):
+    """``(columns, mean_line_bytes)`` from the first bytes of a CSV upload"""
+    stream = file.stream
+    position = stream.tell()
+    sample = stream.read(sample_bytes)
+    stream.seek(position)
+    lines = sample.split(b'\n')
+    if len(lines) > 2:
+        # The last line may be cut off by the sample boundary
+        lines = lines[:-1]
+    columns = lines[0].count(b',') + 1 if lines else 1
+    rows = [line for line in lines[1:] if line.strip()]
+    mean_line = sum(len(line) + 1 for line in rows) / len(rows) if rows else max(len(sample), 1)
+    return columns, mean_line
+
+
+def plan_upload(file, budget_bytes=MEMORY_BUDGET_MB * MB, streamable=True):
+    """Estimate an upload's parsing cost and choose ``parse``, ``stream`` or ``reject``"""
+    size = upload_size(file)
+    is_csv = file.filename.endswith('.csv')
+    if is_csv:
+        columns, mean_line = sniff_csv(file)
+        rows = int(size / mean_line)
+        frame_bytes = rows * columns * 8
+        estimate = size + frame_bytes * FRAME_COPIES
+    else:
+        columns, rows = None, None
+        estimate = size * EXCEL_EXPANSION
+
+    if estimate <= budget_bytes:
+        action = 'parse'
+    elif is_csv and streamable:
+        action = 'stream'
+    else:
+        action = 'reject'
+    return {
+        'action': action,
+        'size_mb': size / MB,
+        'estimated_mb': estimate / MB,
+        'budget_mb': budget_bytes / MB,
+        'columns': columns,
+        'estimated_rows': rows,
+    }
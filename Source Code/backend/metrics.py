@@ -0,0 +1,108 @@
+"""Classification metrics from a single confusion matrix
+
+Every metric is derived from one ``k x k`` count matrix built with a single
+``bincount`` over the predictions. Bootstrap confidence intervals resample
+the matrix cells from a multinomial instead of re-scoring rows (resampling
+rows with replacement only changes how many land in each cell), so
+thousands of resamples are one vectorized array operation.
+"""
+import os
+
+import numpy as np
+
+VALIDATION_BOOTSTRAP = int(os.environ.get('VALIDATION_BOOTSTRAP', 2000))
+CONFIDENCE_LEVEL = 0.95
+SUMMARY_METRICS = ('accuracy', 'precision', 'recall', 'f1_score', 'macro_precision', 'macro_recall', 'macro_f1')
+CLASS_METRICS = ('precision', 'recall', 'f1_score')
+
+
+def confusion_matrix(y_true, y_pred, n_classes):
+    """Counts with true classes as rows and predicted classes as columns"""
+    y_true = np.asarray(y_true, dtype=np.int64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.int64).ravel()
+    return np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def _divide(numerator, denominator):
+    """Elementwise division that yields 0 where the denominator is 0 (sklearn's zero_division=0)"""
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64),
+                                                 np.asarray(denominator, dtype=np.float64))
+    return np.divide(numerator, denominator, out=np.zeros(numerator.shape), where=denominator > 0)
+
+
+def matrix_metrics(cm):
+    """Metrics for one matrix ``(k, k)`` or a stack of matrices ``(..., k, k)``"""
+    cm = np.asarray(cm, dtype=np.float64)
+    tp = np.diagonal(cm, axis1=-2, axis2=-1)
+    support = cm.sum(axis=-1)
+    predicted = cm.sum(axis=-2)
+    total = support.sum(axis=-1)
+
+    precision = _divide(tp, predicted)
+    recall = _divide(tp, support)
+    f1 = _divide(2 * precision * recall, precision + recall)
+    weights = _divide(support, np.expand_dims(total, -1))
+    return {
+        'accuracy': _divide(tp.sum(axis=-1), total),
+        'precision': (precision * weights).sum(axis=-1),
+        'recall': (recall * weights).sum(axis=-1),
+        'f1_score': (f1 * weights).sum(axis=-1),
+        'macro_precision': precision.mean(axis=-1),
+        'macro_recall': recall.mean(axis=-1),
+        'macro_f1': f1.mean(axis=-1),
+        'class_precision': precision,
+        'class_recall': recall,
+        'class_f1_score': f1,
+        'support': support,
+    }
+
+
+def bootstrap_metrics(cm, samples=VALIDATION_BOOTSTRAP, confidence=CONFIDENCE_LEVEL, seed=42):
+    """Percentile intervals ``(low, high)`` for every metric in :func:`matrix_metrics`"""
+    cm = np.asarray(cm, dtype=np.int64)
+    n = int(cm.sum())
+    if n == 0 or samples <= 0:
+        return None
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(n, cm.ravel() / n, size=samples).reshape((samples,) + cm.shape)
+    resampled = matrix_metrics(draws)
+    alpha = (1 - confidence) / 2
+    return {name: np.quantile(values, [alpha, 1 - alpha], axis=0)
+            for name, values in resampled.items() if name != 'support'}
+
+
+def evaluate(y_true, y_pred, class_names=None, bootstrap=VALIDATION_BOOTSTRAP, confidence=CONFIDENCE_LEVEL):
+    """Summary metrics, structured per-class metrics, the confusion matrix and bootstrap intervals"""
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    n_classes = max([len(class_names) if class_names is not None else 0,
+                     int(y_true.max(initial=-1)) + 1, int(y_pred.max(initial=-1)) + 1])
+    return evaluate_matrix(confusion_matrix(y_true, y_pred, n_classes), class_names, bootstrap, confidence)
+
+
+def evaluate_matrix(cm, class_names=None, bootstrap=VALIDATION_BOOTSTRAP, confidence=CONFIDENCE_LEVEL):
+    """:func:`evaluate` for an already accumulated confusion matrix"""
+    cm = np.asarray(cm, dtype=np.int64)
+    names = [str(c) for c in (class_names if class_names is not None else [])][:len(cm)]
+    names += [f'Class_{i}' for i in range(len(names), len(cm))]
+
+    point = matrix_metrics(cm)
+    intervals = bootstrap_metrics(cm, bootstrap, confidence)
+
+    results = {name: float(point[name]) for name in SUMMARY_METRICS}
+    per_class = []
+    for i, name in enumerate(names):
+        entry = {'class': name, 'support': int(point['support'][i])}
+        for metric in CLASS_METRICS:
+            entry[metric] = float(point[f'class_{metric}'][i])
+            if intervals is not None:
+                entry[f'{metric}_ci'] = [float(v) for v in intervals[f'class_{metric}'][:, i]]
+        per_class.append(entry)
+
+    results['per_class'] = per_class
+    results['confusion_matrix'] = {'labels': names, 'matrix': cm.tolist()}
+    if intervals is not None:
+        results['confidence_intervals'] = dict(
+            {name: [float(v) for v in intervals[name]] for name in SUMMARY_METRICS},
+            level=confidence, bootstrap_samples=bootstrap, method='multinomial resampling of confusion matrix counts')
+    return results
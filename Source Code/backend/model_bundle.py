@@ -0,0 +1,213 @@
+"""Model bundle: the model plus everything needed to score raw rows
+
+A bundle directory holds ``bundle.json`` (feature order, min-max scaling
+ranges, fill values for missing readings, class names, version) next to the
+model file, so offline tools score rows exactly like the API does. A bare
+``.h5`` model is also accepted; its metadata is then fitted from the
+training dataset the same way ``load_model()`` in app.py does.
+
+Bundles of kind ``keras`` hold an ``.h5`` model; kind ``mlp`` holds the
+weights of a small dense network (see distill.py) evaluated in NumPy.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from extraction import EXTRACTED_COLUMNS, EXTRACTOR_PATH, FeatureExtractor
+from feature_selection import ARTIFACT_DIR, check_features, file_digest, load_selected_features
+
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join('..', 'gru_water_quality.h5'))
+DATASET_PATH = os.path.join('..', 'selected_features_water_quality.csv')
+STUDENT_PATH = os.environ.get('STUDENT_PATH', os.path.join(ARTIFACT_DIR, 'student_bundle'))
+BUNDLE_FILE = 'bundle.json'
+BUNDLE_FORMAT = 1
+TARGET = 'PSI_Level'
+
+
+def dataset_metadata(dataset_path, features, target=TARGET):
+    """Scaling ranges, column means and sorted class names from a training CSV"""
+    df = pd.read_csv(dataset_path, usecols=list(features) + [target])
+    X = df[list(features)]
+    return {
+        'data_min': X.min().to_numpy(dtype=np.float64),
+        'data_max': X.max().to_numpy(dtype=np.float64),
+        'fill_values': X.mean().to_numpy(dtype=np.float64),
+        # LabelEncoder orders classes the same way
+        'classes': sorted(df[target].dropna().astype(str).unique().tolist()),
+    }
+
+
+def model_file(path):
+    """The model file inside a bundle directory, or ``path`` itself for a bare model"""
+    if os.path.isdir(path):
+        with open(os.path.join(path, BUNDLE_FILE)) as f:
+            return os.path.join(path, json.load(f)['model_file'])
+    return path
+
+
+def load_keras(path):
+    import tensorflow as tf
+    return tf.keras.models.load_model(path, compile=False)
+
+
+class NumpyMLP:
+    """Dense ReLU network with a softmax output, evaluated in NumPy
+
+    Offers the parts of the Keras model interface the serving code uses
+    (``predict``, ``input_shape``, ``output_shape``, ``get_weights``), so a
+    distilled student can stand in for the GRU without TensorFlow on the
+    request path.
+    """
+
+    def __init__(self, weights, biases):
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.input_shape = (None, 1, self.weights[0].shape[0])
+        self.output_shape = (None, self.weights[-1].shape[1])
+
+    @classmethod
+    def from_keras(cls, model):
+        """Copy the kernels and biases of a Sequential stack of Dense layers"""
+        dense = [layer.get_weights() for layer in model.layers if layer.get_weights()]
+        return cls([kernel for kernel, _ in dense], [bias for _, bias in dense])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = len(data.files) // 2
+            return cls([data[f'W{i}'] for i in range(layers)], [data[f'b{i}'] for i in range(layers)])
+
+    def save(self, path):
+        arrays = {}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'W{i}'], arrays[f'b{i}'] = W, b
+        np.savez(path, **arrays)
+
+    def get_weights(self):
+        return [w for pair in zip(self.weights, self.biases) for w in pair]
+
+    def predict(self, X, batch_size=None, verbose=0):
+        """Class probabilities for ``(rows, features)`` or ``(rows, 1, features)`` input"""
+        h = np.asarray(X, dtype=np.float32).reshape(len(X), -1)
+        for W, b in zip(self.weights[:-1], self.biases[:-1]):
+            h = np.maximum(h @ W + b, 0)
+        logits = h @ self.weights[-1] + self.biases[-1]
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_model_file(path):
+    """A Keras ``.h5`` model, or a :class:`NumpyMLP` from an ``.npz`` file"""
+    if path.endswith('.npz'):
+        return NumpyMLP.load(path)
+    return load_keras(path)
+
+
+class ModelBundle:
+    """A loaded model with its preprocessing, ready to score DataFrames"""
+
+    def __init__(self, model, features, data_min, data_max, fill_values, classes, version,
+                 kind='keras', extractor=None, path=None):
+        self.model = model
+        self.features = list(features)
+        self.data_min = np.asarray(data_min, dtype=np.float64)
+        self.data_max = np.asarray(data_max, dtype=np.float64)
+        self.fill_values = np.asarray(fill_values, dtype=np.float64)
+        self.classes = [str(c) for c in classes]
+        self.version = version
+        self.kind = kind
+        self.extractor = extractor
+        self.path = path
+        self.span = self.data_max - self.data_min
+        self.span[self.span == 0] = 1.0
+
+    @classmethod
+    def load(cls, path=MODEL_PATH, dataset_path=DATASET_PATH):
+        """Load a bundle directory, or a bare model file plus its training dataset"""
+        if os.path.isdir(path):
+            with open(os.path.join(path, BUNDLE_FILE)) as f:
+                meta = json.load(f)
+            model_path = os.path.join(path, meta['model_file'])
+            if meta['kind'] == 'keras':
+                model = load_keras(model_path)
+            elif meta['kind'] == 'mlp':
+                model = NumpyMLP.load(model_path)
+            else:
+                raise ValueError(f"Unsupported bundle kind: {meta['kind']}")
+            features = meta['features']
+            version = meta.get('version') or file_digest(model_path)[:16]
+        else:
+            model = load_keras(path)
+            features = check_features(load_selected_features(), columns=pd.read_csv(dataset_path, nrows=0).columns,
+                                      n_inputs=model.input_shape[-1])
+            meta = dict(dataset_metadata(dataset_path, features), kind='keras')
+            version = file_digest(path)[:16]
+
+        if model.input_shape[-1] != len(features):
+            raise ValueError(f"Model expects {model.input_shape[-1]} features but the bundle lists {len(features)}")
+        extractor = None
+        if any(c in features for c in EXTRACTED_COLUMNS) and os.path.exists(EXTRACTOR_PATH):
+            extractor = FeatureExtractor.load(EXTRACTOR_PATH)
+        return cls(model, features, meta['data_min'], meta['data_max'], meta['fill_values'], meta['classes'],
+                   version, kind=meta['kind'], extractor=extractor, path=path)
+
+    def metadata(self):
+        return {
+            'format': BUNDLE_FORMAT,
+            'kind': self.kind,
+            'features': self.features,
+            'data_min': self.data_min.tolist(),
+            'data_max': self.data_max.tolist(),
+            'fill_values': self.fill_values.tolist(),
+            'classes': self.classes,
+            'version': self.version,
+        }
+
+    def save(self, directory, extra=None):
+        """Write the model and ``bundle.json`` (plus any ``extra`` metadata) into ``directory``"""
+        tmp_dir = directory.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        model_file = 'model.npz' if self.kind == 'mlp' else 'model.h5'
+        self.model.save(os.path.join(tmp_dir, model_file))
+        meta = dict(self.metadata(), model_file=model_file, created=time.time(), **(extra or {}))
+        with open(os.path.join(tmp_dir, BUNDLE_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp_dir, directory)
+        return directory
+
+    def prepare(self, df):
+        """Scaled float32 feature matrix; missing readings take the training mean"""
+        if self.extractor is not None and any(c in self.features and c not in df.columns for c in EXTRACTED_COLUMNS):
+            if all(f in df.columns for f in self.extractor.features):
+                df = self.extractor.transform_frame(df)
+        missing = [f for f in self.features if f not in df.columns]
+        if missing:
+            raise ValueError(f'Missing feature columns: {missing}')
+        X = df[self.features].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        X = np.where(np.isnan(X), self.fill_values, X)
+        return ((X - self.data_min) / self.span).astype(np.float32)
+
+    def predict_proba(self, X, batch_size=1024):
+        """Class probabilities for a scaled ``(rows, features)`` matrix"""
+        if len(X) == 0:
+            return np.zeros((0, len(self.classes)), dtype=np.float32)
+        return np.asarray(self.model.predict(X.reshape(len(X), 1, -1), batch_size=batch_size, verbose=0))
+
+    def score_frame(self, df, batch_size=1024):
+        """Predicted class, confidence and per-class probabilities for each row"""
+        probabilities = self.predict_proba(self.prepare(df), batch_size)
+        predicted = probabilities.argmax(axis=1)
+        out = pd.DataFrame({
+            'predicted_class': np.asarray(self.classes, dtype=object)[predicted],
+            'confidence': probabilities.max(axis=1),
+        }, index=df.index)
+        for i, name in enumerate(self.classes):
+            out[f'prob_{name}'] = probabilities[:, i]
+        return out
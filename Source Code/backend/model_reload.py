@@ -0,0 +1,143 @@
+"""Hot reload of the served model without restarting workers
+
+Each worker runs a watcher thread that polls the model file's size and
+mtime every ``MODEL_RELOAD_INTERVAL`` seconds. Once a change has stayed the
+same for one more poll (so a file still being copied is not read), the new
+model is loaded and warmed up in the background while requests keep being
+served by the old one. Only a model that loads, matches the expected input
+and output shapes and returns finite probabilities on the warmup batch is
+swapped in, by rebinding one reference; requests already running finish on
+the model they started with.
+
+Workers reload independently and converge on the same file digest within
+one or two polls. ``POST /api/admin/reload-model`` reloads the worker that
+answers it at once; it is only enabled when ``ADMIN_TOKEN`` is set, and a
+call that arrives during a reload (forced or not) is refused rather than
+queued behind it.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from feature_selection import file_digest
+
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 10))
+WARMUP_ROWS = 32
+HISTORY_SIZE = 20
+
+
+def file_signature(path):
+    """``(size, mtime_ns)`` of ``path``, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def warm_up(model, rows=WARMUP_ROWS):
+    """Run one batch through ``model`` so the first request does not pay for graph tracing"""
+    shape = [rows] + [d or 1 for d in model.input_shape[1:]]
+    probabilities = np.asarray(model.predict(np.random.default_rng(0).random(shape, dtype=np.float32), verbose=0))
+    if not np.all(np.isfinite(probabilities)):
+        raise ValueError('Warmup batch produced non-finite outputs')
+    return probabilities
+
+
+class ModelReloader:
+    """Loads new versions of a model file in the background and hands them to ``swap``
+
+    ``load(path)`` returns a model or raises; ``swap(model, version)`` makes it
+    the served model. One reload runs at a time.
+    """
+
+    def __init__(self, path, load, swap, version=None, interval=MODEL_RELOAD_INTERVAL):
+        self.path = path
+        self.load = load
+        self.swap = swap
+        self.version = version
+        self.interval = interval
+        self.state = 'idle'
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_reload = None
+        self.history = []
+        self._signature = file_signature(path)
+        self._pending = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name='model-reload', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            signature = file_signature(self.path)
+            if signature is None or signature == self._signature:
+                self._pending = None
+                continue
+            if signature != self._pending:
+                # Changed since the last poll; wait until the file stops changing
+                self._pending = signature
+                continue
+            self._pending = None
+            self.reload(trigger='watcher')
+
+    def reload(self, trigger='manual', force=False):
+        """Load, check, warm up and swap in the model at ``path``; returns a summary"""
+        if not self._reload_lock.acquire(blocking=False):
+            return {'status': 'in_progress', 'version': self.version}
+        started = time.time()
+        try:
+            self._signature = file_signature(self.path)
+            version = file_digest(self.path)[:16]
+            if version == self.version and not force:
+                return {'status': 'unchanged', 'version': version}
+
+            self.state = 'loading'
+            candidate = self.load(self.path)
+            self.state = 'warming'
+            warm_up(candidate)
+            previous = self.version
+            self.swap(candidate, version)
+            self.version = version
+            self.reloads += 1
+            self.last_error = None
+            result = {'status': 'reloaded', 'version': version, 'previous_version': previous}
+            print(f"✅ Model reloaded ({trigger}): {previous} -> {version} in {time.time() - started:.1f}s")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            result = {'status': 'failed', 'version': self.version, 'error': str(e)}
+            print(f"❌ Model reload failed ({trigger}), still serving {self.version}: {str(e)}")
+        finally:
+            self.state = 'idle'
+            self._reload_lock.release()
+
+        self.last_reload = dict(result, trigger=trigger, started=started, seconds=time.time() - started)
+        self.history = (self.history + [self.last_reload])[-HISTORY_SIZE:]
+        return result
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'version': self.version,
+            'state': self.state,
+            'watching': self._thread is not None and not self._stop.is_set(),
+            'interval_seconds': self.interval,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_reload': self.last_reload,
+            'worker_pid': os.getpid(),
+        }
@@ -0,0 +1,176 @@
+"""Constant-memory drift and out-of-range monitoring for scored inputs"""
+import threading
+import time
+
+import numpy as np
+
+# Number of histogram bins spanning the training range of each feature.
+# Values outside the range fall into one underflow and one overflow bin.
+HISTOGRAM_BINS = 32
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+class FeatureSketch:
+    """Streaming summary of a single feature in O(1) memory"""
+
+    def __init__(self, name, low, high, reference=None):
+        self.name = name
+        self.low = float(low)
+        self.high = float(high)
+        span = self.high - self.low
+        if span <= 0:
+            span = 1.0
+        self.edges = np.linspace(self.low, self.low + span, HISTOGRAM_BINS + 1)
+        # bins: [underflow, HISTOGRAM_BINS in-range bins, overflow]
+        self.bins = np.zeros(HISTOGRAM_BINS + 2, dtype=np.int64)
+        self.reference = None
+        if reference is not None:
+            self.reference = self._histogram(np.asarray(reference, dtype=float))
+        self.count = 0
+        self.missing = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def _histogram(self, values):
+        idx = np.searchsorted(self.edges, values, side='right')
+        # The top edge belongs to the last in-range bin.
+        idx[values == self.edges[-1]] = HISTOGRAM_BINS
+        return np.bincount(idx, minlength=HISTOGRAM_BINS + 2)
+
+    def update(self, values):
+        """Merge a batch of values using Chan's parallel variance update"""
+        values = np.asarray(values, dtype=float)
+        finite = values[np.isfinite(values)]
+        self.missing += int(values.size - finite.size)
+        n = finite.size
+        if n == 0:
+            return
+
+        batch_mean = float(finite.mean())
+        batch_m2 = float(((finite - batch_mean) ** 2).sum())
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.minimum = min(self.minimum, float(finite.min()))
+        self.maximum = max(self.maximum, float(finite.max()))
+        self.bins += self._histogram(finite)
+
+    def quantile(self, q):
+        """Approximate quantile by interpolating inside the histogram bins"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = np.cumsum(self.bins)
+        i = int(np.searchsorted(cumulative, target, side='left'))
+        if i == 0:
+            return self.minimum
+        if i == HISTOGRAM_BINS + 1:
+            return self.maximum
+        before = cumulative[i - 1]
+        in_bin = self.bins[i]
+        left, right = self.edges[i - 1], self.edges[i]
+        fraction = (target - before) / in_bin if in_bin else 0.0
+        value = left + fraction * (right - left)
+        return float(min(max(value, self.minimum), self.maximum))
+
+    def drift(self):
+        """Population stability index of the live histogram vs training"""
+        if self.reference is None or self.count == 0:
+            return None
+        return population_stability_index(self.reference, self.bins)
+
+    def snapshot(self):
+        out_of_range = int(self.bins[0] + self.bins[-1])
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'missing': self.missing,
+            'min': self.minimum if self.count else None,
+            'max': self.maximum if self.count else None,
+            'mean': self.mean if self.count else None,
+            'std': float(np.sqrt(variance)) if self.count else None,
+            'quantiles': {str(q): self.quantile(q) for q in QUANTILES},
+            'training_range': [self.low, self.high],
+            'below_range': int(self.bins[0]),
+            'above_range': int(self.bins[-1]),
+            'out_of_range_rate': out_of_range / self.count if self.count else 0.0,
+            'drift_psi': self.drift(),
+        }
+
+
+def population_stability_index(expected, actual, eps=1e-6):
+    """Population stability index between two count vectors"""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    p = expected / max(expected.sum(), 1.0) + eps
+    q = actual / max(actual.sum(), 1.0) + eps
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+class InputMonitor:
+    """Per-feature sketches plus predicted class drift against training"""
+
+    def __init__(self, feature_names, data_min, data_max, class_names,
+                 training_class_counts=None, reference_data=None):
+        self.feature_names = list(feature_names)
+        self.class_names = [str(c) for c in class_names]
+        self.sketches = []
+        for i, name in enumerate(self.feature_names):
+            reference = None
+            if reference_data is not None:
+                reference = np.asarray(reference_data)[:, i]
+            self.sketches.append(FeatureSketch(name, data_min[i], data_max[i], reference))
+        self.class_counts = np.zeros(len(self.class_names), dtype=np.int64)
+        if training_class_counts is None:
+            training_class_counts = np.ones(len(self.class_names))
+        self.training_class_counts = np.asarray(training_class_counts, dtype=float)
+        self.rows = 0
+        self.rows_out_of_range = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, X, predicted_classes=None):
+        """Record a batch of scored rows of shape (n, n_features)"""
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.feature_names))
+        with self._lock:
+            for i, sketch in enumerate(self.sketches):
+                sketch.update(X[:, i])
+            lows = np.array([s.low for s in self.sketches])
+            highs = np.array([s.high for s in self.sketches])
+            outside = ((X < lows) | (X > highs)).any(axis=1)
+            self.rows += X.shape[0]
+            self.rows_out_of_range += int(outside.sum())
+            if predicted_classes is not None:
+                idx = np.asarray(predicted_classes)
+                if idx.dtype.kind not in 'iu':
+                    lookup = {name: i for i, name in enumerate(self.class_names)}
+                    idx = np.array([lookup.get(str(c), -1) for c in idx])
+                idx = idx[(idx >= 0) & (idx < len(self.class_names))]
+                self.class_counts += np.bincount(idx, minlength=len(self.class_names))
+
+    def snapshot(self):
+        with self._lock:
+            total = int(self.class_counts.sum())
+            training_total = max(self.training_class_counts.sum(), 1.0)
+            live = self.class_counts / total if total else np.zeros_like(self.training_class_counts)
+            expected = self.training_class_counts / training_total
+            return {
+                'rows_scored': self.rows,
+                'rows_out_of_range': self.rows_out_of_range,
+                'row_out_of_range_rate': self.rows_out_of_range / self.rows if self.rows else 0.0,
+                'uptime_seconds': time.time() - self.started_at,
+                'features': {s.name: s.snapshot() for s in self.sketches},
+                'class_distribution': {
+                    'live': {name: float(p) for name, p in zip(self.class_names, live)},
+                    'training': {name: float(p) for name, p in zip(self.class_names, expected)},
+                    'counts': {name: int(c) for name, c in zip(self.class_names, self.class_counts)},
+                    'total_variation': float(0.5 * np.abs(live - expected).sum()) if total else None,
+                    'drift_psi': population_stability_index(
+                        self.training_class_counts, self.class_counts) if total else None,
+                },
+            }
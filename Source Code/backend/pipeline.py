@@ -0,0 +1,348 @@
+"""Out-of-core preprocessing pipeline from the raw dataset to model-ready features
+
+Reproduces the notebook steps (dropna, MinMaxScaler, PSI labelling, ratio /
+interaction / polynomial features, PCA / k-means, feature selection) as stages that stream
+the data in bounded-size chunks. Each stage writes Parquet under
+``ARTIFACT_DIR/pipeline`` keyed on a hash of its upstream key and parameters,
+so only the stages downstream of a change are re-run.
+
+Usage:
+    python pipeline.py "../../Datasets/water quality dataset.csv" \\
+        [--output selected_features_water_quality.csv] [--chunk-rows 100000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import psi
+from extraction import EXTRACTOR_PATH, fit_extractor
+from feature_selection import ARTIFACT_DIR, LATEST_SELECTION_PATH, file_digest, select_features
+
+BASE_FEATURES = ['ph', 'hardness', 'solids', 'chloramines', 'sulfate',
+                 'conductivity', 'organic_carbon', 'trihalomethanes', 'turbidity']
+CHUNK_ROWS = 100000
+SELECTION_SAMPLE_ROWS = 200000
+PIPELINE_DIR = os.path.join(ARTIFACT_DIR, 'pipeline')
+
+
+def stage_key(name, version, upstream_key, params):
+    payload = json.dumps({'stage': name, 'version': version, 'upstream': upstream_key, 'params': params},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def iter_parquet(path, chunk_rows=CHUNK_ROWS, columns=None):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def parquet_rows(path):
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def write_parquet(frames, path):
+    """Stream DataFrames into one Parquet file, one row group per frame"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    writer = None
+    rows = 0
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def publish_file(source, destination):
+    """Atomically copy a stage artifact to the location other components read it from"""
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    tmp_path = destination + '.tmp'
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+class Stage:
+    """One cached pipeline step producing a Parquet file
+
+    Artifacts other than the data (fitted models, selections) are written
+    into the stage's own output directory by :meth:`run` and copied to their
+    shared locations by :meth:`publish`, which also runs on a cache hit so
+    the shared copies always match the dataset that was just processed.
+    """
+
+    name = None
+    version = 1
+
+    def params(self, options):
+        return {}
+
+    def run(self, input_path, options):
+        """Return ``(frames, meta)``; frames may be a lazy iterator
+
+        ``options['stage_dir']`` is the directory the stage's output is written to.
+        """
+        raise NotImplementedError
+
+    def publish(self, stage_dir, options):
+        """Copy this stage's artifacts from ``stage_dir`` to their shared locations"""
+
+
+def execute(stage, upstream_key, input_path, options, force=False):
+    """Run ``stage`` unless its output for this key already exists"""
+    params = stage.params(options)
+    key = stage_key(stage.name, stage.version, upstream_key, params)
+    out_dir = os.path.join(PIPELINE_DIR, f'{stage.name}-{key}')
+    meta_path = os.path.join(out_dir, 'meta.json')
+
+    if os.path.exists(meta_path) and not force:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        stage.publish(out_dir, options)
+        print(f"⏭️  {stage.name}: cached ({meta['rows']} rows)")
+        return key, os.path.join(out_dir, 'data.parquet'), meta
+
+    started = time.time()
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        frames, meta = stage.run(input_path, dict(options, stage_dir=tmp_dir))
+        meta = dict(meta, rows=write_parquet(frames, os.path.join(tmp_dir, 'data.parquet')),
+                    params=params, upstream=upstream_key, seconds=time.time() - started)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2, default=str)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.rename(tmp_dir, out_dir)
+    stage.publish(out_dir, options)
+    print(f"✅ {stage.name}: {meta['rows']} rows in {meta['seconds']:.2f}s")
+    return key, os.path.join(out_dir, 'data.parquet'), meta
+
+
+def normalize_columns(df):
+    """Strip the ``_scaled`` suffix used by the shipped raw dataset"""
+    return df.rename(columns=lambda c: str(c).strip().lower()[:-len(psi.SCALED_SUFFIX)]
+                     if str(c).strip().lower().endswith(psi.SCALED_SUFFIX) else str(c).strip().lower())
+
+
+class CleanStage(Stage):
+    """Keep the physicochemical features and drop rows with missing values"""
+
+    name = 'clean'
+
+    def params(self, options):
+        return {'features': BASE_FEATURES}
+
+    def run(self, input_path, options):
+        def frames():
+            if input_path.endswith('.parquet'):
+                chunks = iter_parquet(input_path, options['chunk_rows'])
+            else:
+                chunks = pd.read_csv(input_path, chunksize=options['chunk_rows'], low_memory=False)
+            for chunk in chunks:
+                chunk = normalize_columns(chunk)
+                present = [f for f in BASE_FEATURES if f in chunk.columns]
+                yield chunk[present].apply(pd.to_numeric, errors='coerce').dropna().astype(np.float64)
+        return frames(), {}
+
+
+class ScaleStage(Stage):
+    """Min-max scale every column using global ranges from a first pass"""
+
+    name = 'scale'
+
+    def run(self, input_path, options):
+        low, high = None, None
+        for chunk in iter_parquet(input_path, options['chunk_rows']):
+            if chunk.empty:
+                continue
+            low = chunk.min() if low is None else np.minimum(low, chunk.min())
+            high = chunk.max() if high is None else np.maximum(high, chunk.max())
+        if low is None:
+            raise ValueError('scale: no rows to fit the ranges on; every row was dropped by the clean stage '
+                             f'(it keeps rows with all of {BASE_FEATURES} present and numeric)')
+        span = (high - low).replace(0, 1.0)
+
+        def frames():
+            for chunk in iter_parquet(input_path, options['chunk_rows']):
+                yield (chunk - low) / span
+        return frames(), {'data_min': low.to_dict(), 'data_max': high.to_dict()}
+
+
+class LabelStage(Stage):
+    """Add the Pollution Severity Index and its level"""
+
+    name = 'label'
+
+    def params(self, options):
+        return {'psi': options['psi_config']}
+
+    def run(self, input_path, options):
+        config = dict(options['psi_config'], ranges={})
+
+        def frames():
+            for chunk in iter_parquet(input_path, options['chunk_rows']):
+                values = psi.compute_psi(chunk, config)
+                yield chunk.assign(PSI=values, PSI_Level=psi.psi_levels(values, config).astype(str))
+        return frames(), {}
+
+
+class EngineerStage(Stage):
+    """Ratio, interaction and polynomial features from the notebook"""
+
+    name = 'engineer'
+
+    def run(self, input_path, options):
+        def frames():
+            for df in iter_parquet(input_path, options['chunk_rows']):
+                df['solids_per_conductivity'] = df['solids'] / (df['conductivity'] + 1e-6)
+                df['chloramine_sulfate_ratio'] = df['chloramines'] / (df['sulfate'] + 1e-6)
+                df['organic_load_index'] = df['organic_carbon'] * df['turbidity']
+                df['ph_squared'] = df['ph'] ** 2
+                df['turbidity_squared'] = df['turbidity'] ** 2
+                yield df
+        return frames(), {}
+
+
+class ExtractStage(Stage):
+    """PC1, PC2 and Cluster from incremental PCA and mini-batch k-means"""
+
+    name = 'extract'
+    version = 2
+    artifact = 'feature_extractor.npz'
+
+    def params(self, options):
+        return {'features': BASE_FEATURES, 'n_components': 2, 'n_clusters': 4, 'random_state': 42}
+
+    def run(self, input_path, options):
+        params = self.params(options)
+        extractor = fit_extractor(iter_parquet(input_path, options['chunk_rows']), params['features'],
+                                  n_components=params['n_components'], n_clusters=params['n_clusters'],
+                                  random_state=params['random_state'])
+        # Keep the scale stage ranges so the API can accept unscaled readings
+        scale = options.get('scale_meta') or {}
+        if scale:
+            extractor.data_min = np.array([scale['data_min'][f] for f in extractor.features])
+            extractor.data_max = np.array([scale['data_max'][f] for f in extractor.features])
+        extractor.save(os.path.join(options['stage_dir'], self.artifact))
+
+        def frames():
+            for chunk in iter_parquet(input_path, options['chunk_rows']):
+                yield extractor.transform_frame(chunk)
+        return frames(), extractor.describe()
+
+    def publish(self, stage_dir, options):
+        publish_file(os.path.join(stage_dir, self.artifact), options.get('extractor_path', EXTRACTOR_PATH))
+
+
+class SelectStage(Stage):
+    """Random Forest feature selection on a bounded sample, then project all rows"""
+
+    name = 'select'
+    version = 2
+    artifact = 'selected_features.json'
+
+    def params(self, options):
+        return {'sample_rows': options['sample_rows'], 'selection': options.get('selection', {})}
+
+    def run(self, input_path, options):
+        total = parquet_rows(input_path)
+        fraction = min(1.0, options['sample_rows'] / max(total, 1))
+        rng = np.random.default_rng(42)
+        sample = pd.concat(
+            [chunk[rng.random(len(chunk)) < fraction] for chunk in iter_parquet(input_path, options['chunk_rows'])],
+            ignore_index=True
+        )
+        artifact = select_features(df=sample, params=options.get('selection'))
+        with open(os.path.join(options['stage_dir'], self.artifact), 'w') as f:
+            json.dump({k: v for k, v in artifact.items() if k != 'cache_hit'}, f, indent=2)
+        columns = artifact['selected_features'] + [artifact['params']['target']]
+
+        def frames():
+            for chunk in iter_parquet(input_path, options['chunk_rows'], columns=columns):
+                yield chunk
+        return frames(), {'selected_features': artifact['selected_features'],
+                          'importances': artifact['importances'], 'sample_rows': len(sample)}
+
+    def publish(self, stage_dir, options):
+        publish_file(os.path.join(stage_dir, self.artifact), LATEST_SELECTION_PATH)
+
+
+STAGES = [CleanStage(), ScaleStage(), LabelStage(), EngineerStage(), ExtractStage(), SelectStage()]
+
+
+def run_pipeline(input_path, chunk_rows=CHUNK_ROWS, sample_rows=SELECTION_SAMPLE_ROWS,
+                 psi_config=None, selection=None, force_from=None):
+    """Run every stage in order and return the final Parquet path and stage metadata"""
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    options = {
+        'chunk_rows': chunk_rows,
+        'sample_rows': sample_rows,
+        'psi_config': psi_config or psi.load_config(),
+        'selection': selection or {},
+    }
+    key = file_digest(input_path)
+    path = input_path
+    metas = {}
+    force = False
+    for stage in STAGES:
+        force = force or stage.name == force_from
+        key, path, metas[stage.name] = execute(stage, key, path, options, force=force)
+        if stage.name == 'scale':
+            options['scale_meta'] = metas['scale']
+    return path, metas
+
+
+def export_csv(parquet_path, csv_path, chunk_rows=CHUNK_ROWS):
+    """Stream a Parquet file out as CSV without loading it whole"""
+    header = True
+    with open(csv_path, 'w', newline='') as f:
+        for chunk in iter_parquet(parquet_path, chunk_rows):
+            chunk.to_csv(f, header=header, index=False)
+            header = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Out-of-core water quality preprocessing pipeline')
+    parser.add_argument('input', help='Raw dataset (CSV or Parquet)')
+    parser.add_argument('--output', help='Write the model-ready features to this CSV')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows held in memory per chunk')
+    parser.add_argument('--sample-rows', type=int, default=SELECTION_SAMPLE_ROWS,
+                        help='Rows sampled for feature selection')
+    parser.add_argument('--psi-config', help='JSON file with PSI weights and bin edges')
+    parser.add_argument('--force-from', choices=[s.name for s in STAGES], help='Re-run from this stage on')
+    args = parser.parse_args()
+
+    started = time.time()
+    try:
+        path, metas = run_pipeline(args.input, chunk_rows=args.chunk_rows, sample_rows=args.sample_rows,
+                                   psi_config=psi.load_config(args.psi_config), force_from=args.force_from)
+    except ValueError as e:
+        print(f"❌ Pipeline stopped: {str(e)}")
+        raise SystemExit(1)
+    print(f"✅ Pipeline finished in {time.time() - started:.2f}s: {path}")
+    print(f"✅ Selected features: {metas['select']['selected_features']}")
+
+    if args.output:
+        export_csv(path, args.output, args.chunk_rows)
+        print(f"✅ Saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""Bounded LRU cache of model outputs keyed on rounded feature vectors and model version
+
+Stations often report identical readings for long stretches, so the cache
+skips ``model.predict`` for vectors already scored by the current model
+version. Callers pass the model version they read with the model to both
+``get`` and ``put``, so a lookup racing a model swap can never return the
+other model's output under its version. ``PREDICTION_CACHE=local`` keeps a per-process LRU;
+``PREDICTION_CACHE=shared`` uses a set-associative table in a shared memory
+segment so every gunicorn worker on the host benefits from each other's work.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PREDICTION_CACHE = os.environ.get('PREDICTION_CACHE', 'local')
+PREDICTION_CACHE_MB = float(os.environ.get('PREDICTION_CACHE_MB', 64))
+PREDICTION_CACHE_PRECISION = int(os.environ.get('PREDICTION_CACHE_PRECISION', 4))
+PREDICTION_CACHE_SHM = os.environ.get('PREDICTION_CACHE_SHM', 'wq_prediction_cache')
+
+# Approximate per-entry overhead of the OrderedDict node, key bytes and array header
+LOCAL_ENTRY_OVERHEAD = 200
+SHARED_WAYS = 4
+# Shared segment header: magic, n_outputs, n_sets, ways, model version hash
+SHARED_MAGIC = 0x3153484341435157
+SHARED_HEADER_BYTES = 64
+
+
+def cache_key(features, precision, version=''):
+    rounded = np.round(np.asarray(features, dtype=np.float64).ravel(), precision) + 0.0
+    return str(version).encode() + b'\0' + rounded.tobytes()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class PredictionCache:
+    """Per-process LRU bounded by an approximate byte budget"""
+
+    mode = 'local'
+
+    def __init__(self, max_bytes=PREDICTION_CACHE_MB * 1024 * 1024, precision=PREDICTION_CACHE_PRECISION,
+                 version=''):
+        self.max_bytes = int(max_bytes)
+        self.precision = precision
+        self.version = str(version)
+        self.bytes = 0
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, features, version=None):
+        """Cached probabilities for ``features`` under model ``version`` (default: the current one)"""
+        key = cache_key(features, self.precision, self.version if version is None else version)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def put(self, features, probabilities, version=None):
+        """Store ``probabilities``; skipped if they came from a model ``version`` no longer current"""
+        if version is not None and str(version) != self.version:
+            return
+        key = cache_key(features, self.precision, self.version)
+        value = np.array(probabilities, dtype=np.float32)
+        size = len(key) + value.nbytes + LOCAL_ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                old_key, old_value = self._entries.popitem(last=False)
+                self.bytes -= len(old_key) + old_value.nbytes + LOCAL_ENTRY_OVERHEAD
+                self.stats.evictions += 1
+
+    def invalidate(self, version):
+        """Drop every entry; called when a new model version is loaded"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.version = str(version)
+            self.stats.invalidations += 1
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats.as_dict(), mode=self.mode, entries=len(self._entries),
+                        bytes=self.bytes, max_bytes=self.max_bytes, precision=self.precision,
+                        version=self.version, worker_pid=os.getpid())
+
+
+class SharedPredictionCache:
+    """Set-associative cache in POSIX shared memory, shared by all workers
+
+    Each slot carries a sequence counter: writers (serialized by a file lock)
+    make it odd while writing, and readers treat any slot whose counter was
+    odd or changed while they read it as a miss instead of retrying. Stale model versions never
+    match because the version hash is part of every slot's key.
+
+    The segment starts with a header recording the slot layout (outputs per
+    slot, sets, ways) and the current model version. A worker whose model
+    or size settings do not match a segment left by an earlier deployment
+    unlinks it and creates a fresh one. The gunicorn master removes the
+    segment on exit (:func:`unlink_shared_cache`).
+    """
+
+    mode = 'shared'
+
+    def __init__(self, n_outputs, max_bytes=PREDICTION_CACHE_MB * 1024 * 1024,
+                 precision=PREDICTION_CACHE_PRECISION, version='', name=PREDICTION_CACHE_SHM):
+        import fcntl
+        from multiprocessing import resource_tracker, shared_memory
+
+        self._fcntl = fcntl
+        self.precision = precision
+        self.stats = CacheStats()
+        self.dtype = np.dtype([
+            ('seq', np.uint64), ('key', np.uint64, (2,)), ('version', np.uint64),
+            ('tick', np.uint64), ('probs', np.float32, (n_outputs,)),
+        ])
+        self.n_sets = max(1, int(max_bytes) // (self.dtype.itemsize * SHARED_WAYS))
+        size = SHARED_HEADER_BYTES + self.n_sets * SHARED_WAYS * self.dtype.itemsize
+        self.version = str(version)
+        self._version_id = self._hash_version(self.version)
+        layout = [SHARED_MAGIC, n_outputs, self.n_sets, SHARED_WAYS, int(self._version_id)]
+
+        self.lock_file = open(os.path.join('/tmp', f'{name}.lock'), 'a')
+        # Workers starting together must not both replace a mismatched segment
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(name=name)
+                if self.shm.size < size or list(self._header()) != layout:
+                    print(f"⚠️ Shared cache segment {name} has another layout or model version, recreating it")
+                    self.shm.close()
+                    self.shm.unlink()
+                    self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            # Keep the segment alive when an individual worker exits
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+            self._header()[:] = layout
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+        self.slots = np.ndarray((self.n_sets, SHARED_WAYS), dtype=self.dtype, buffer=self.shm.buf,
+                                offset=SHARED_HEADER_BYTES)
+
+    def _header(self):
+        return np.ndarray((5,), dtype=np.uint64, buffer=self.shm.buf)
+
+    @staticmethod
+    def _hash_version(version):
+        return np.frombuffer(hashlib.blake2b(version.encode(), digest_size=8).digest(), dtype=np.uint64)[0]
+
+    def _locate(self, features, version):
+        digest = np.frombuffer(
+            hashlib.blake2b(cache_key(features, self.precision, version), digest_size=16).digest(), dtype=np.uint64)
+        return digest, int(digest[0] % self.n_sets)
+
+    def get(self, features, version=None):
+        """Cached probabilities for ``features`` under model ``version`` (default: the current one)"""
+        version = self.version if version is None else str(version)
+        version_id = self._hash_version(version)
+        digest, set_index = self._locate(features, version)
+        ways = self.slots[set_index]
+        for way in range(SHARED_WAYS):
+            slot = ways[way]
+            before = int(slot['seq'])
+            if before % 2 or slot['version'] != version_id or not np.array_equal(slot['key'], digest):
+                continue
+            probs = slot['probs'].copy()
+            if int(slot['seq']) != before:
+                continue
+            slot['tick'] = np.uint64(time.monotonic_ns())
+            self.stats.hits += 1
+            return probs
+        self.stats.misses += 1
+        return None
+
+    def put(self, features, probabilities, version=None):
+        if version is not None and str(version) != self.version:
+            return
+        digest, set_index = self._locate(features, self.version)
+        ways = self.slots[set_index]
+        self._fcntl.flock(self.lock_file, self._fcntl.LOCK_EX)
+        try:
+            for w in range(SHARED_WAYS):
+                if ways[w]['version'] == self._version_id and np.array_equal(ways[w]['key'], digest):
+                    return
+            # Prefer an empty or stale-version way, otherwise the least recently used
+            stale = [w for w in range(SHARED_WAYS) if ways[w]['version'] != self._version_id]
+            if stale:
+                way = stale[0]
+            else:
+                way = int(np.argmin(ways['tick']))
+                self.stats.evictions += 1
+            slot = ways[way]
+            seq = int(slot['seq'])
+            slot['seq'] = np.uint64(seq + 1)
+            slot['key'] = digest
+            slot['version'] = self._version_id
+            slot['probs'] = np.asarray(probabilities, dtype=np.float32)
+            slot['tick'] = np.uint64(time.monotonic_ns())
+            slot['seq'] = np.uint64(seq + 2)
+        finally:
+            self._fcntl.flock(self.lock_file, self._fcntl.LOCK_UN)
+
+    def invalidate(self, version):
+        """Switch to a new model version; old slots stop matching immediately"""
+        self.version = str(version)
+        self._version_id = self._hash_version(self.version)
+        # Workers started after the reload attach to the segment instead of recreating it
+        self._header()[4] = self._version_id
+        self.stats.invalidations += 1
+
+    def info(self):
+        current = int((self.slots['version'] == self._version_id).sum())
+        return dict(self.stats.as_dict(), mode=self.mode, entries=current,
+                    capacity=int(self.slots.size), bytes=self.shm.size, precision=self.precision,
+                    version=self.version, segment=self.shm.name, worker_pid=os.getpid())
+
+
+def unlink_shared_cache(name=PREDICTION_CACHE_SHM):
+    """Remove the shared segment and its lock file; returns whether a segment existed"""
+    from multiprocessing import shared_memory
+
+    try:
+        os.remove(os.path.join('/tmp', f'{name}.lock'))
+    except OSError:
+        pass
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    shm.unlink()
+    return True
+
+
+def create_cache(n_outputs, version, mode=PREDICTION_CACHE):
+    """Build the cache selected by ``PREDICTION_CACHE`` (off, local or shared)"""
+    if mode == 'off':
+        return None
+    if mode == 'shared':
+        try:
+            return SharedPredictionCache(n_outputs, version=version)
+        except Exception as e:
+            print(f"⚠️ Shared prediction cache unavailable, using per-process cache: {str(e)}")
+    return PredictionCache(version=version)
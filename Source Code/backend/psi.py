@@ -0,0 +1,310 @@
+"""Pollution Severity Index (PSI) engine for labelling raw water quality data
+
+PSI is a weighted average of min-max scaled physicochemical parameters,
+binned into severity levels. Large CSV files are split into byte ranges on
+line boundaries and scored on all cores, each worker parsing only its range.
+
+Usage:
+    python psi.py INPUT.csv OUTPUT.csv [--config psi_config.json] [--workers N]
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WEIGHTS = {
+    'ph': 0.2,
+    'turbidity': 0.25,
+    'chloramines': 0.2,
+    'solids': 0.2,
+    'organic_carbon': 0.15,
+}
+DEFAULT_BIN_EDGES = [0.25, 0.5, 0.75]
+DEFAULT_LEVELS = ['Low', 'Moderate', 'Severe', 'Critical']
+SCALED_SUFFIX = '_scaled'
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def default_config():
+    return {
+        'weights': dict(DEFAULT_WEIGHTS),
+        'bin_edges': list(DEFAULT_BIN_EDGES),
+        'levels': list(DEFAULT_LEVELS),
+        'ranges': {},
+    }
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value)
+
+
+def validate_config(config):
+    """Return ``config`` if its weights, bin edges, levels and ranges fit together, else raise ValueError"""
+    unknown = set(config) - set(default_config())
+    if unknown:
+        raise ValueError(f"Unknown PSI config keys: {', '.join(sorted(unknown))}")
+    weights, ranges = config['weights'], config['ranges'] or {}
+    if not isinstance(weights, dict) or not all(_is_number(w) for w in weights.values()):
+        raise ValueError('PSI weights must map feature names to numbers')
+    if not isinstance(config['bin_edges'], list) or not all(_is_number(e) for e in config['bin_edges']):
+        raise ValueError('PSI bin edges must be a list of numbers')
+    if not isinstance(config['levels'], list) or not all(isinstance(l, str) for l in config['levels']):
+        raise ValueError('PSI levels must be a list of names')
+    if not isinstance(ranges, dict) or not all(isinstance(r, (list, tuple)) and len(r) == 2 and
+                                               all(_is_number(v) for v in r) for r in ranges.values()):
+        raise ValueError('PSI ranges must map feature names to [low, high] pairs')
+    if len(config['levels']) != len(config['bin_edges']) + 1:
+        raise ValueError('PSI config needs exactly one more level than bin edges')
+    if list(config['bin_edges']) != sorted(config['bin_edges']):
+        raise ValueError('PSI bin edges must be increasing')
+    if not config['weights'] or sum(config['weights'].values()) <= 0:
+        raise ValueError('PSI weights must sum to a positive value')
+    return config
+
+
+def merge_config(config, overrides):
+    """Validated copy of ``config`` updated with ``overrides`` (a dict or its JSON text)"""
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides)
+    if not isinstance(overrides, dict):
+        raise ValueError('PSI config must be a JSON object')
+    merged = dict(config)
+    merged.update(overrides)
+    return validate_config(merged)
+
+
+def load_config(path=None):
+    """Read weights, bin edges, levels and optional scaling ranges from JSON"""
+    config = default_config()
+    if path:
+        with open(path) as f:
+            config = merge_config(config, json.load(f))
+    return config
+
+
+def resolve_columns(columns, features):
+    """Map each PSI feature to a column, accepting ``<feature>_scaled`` names"""
+    lookup = {}
+    for column in columns:
+        key = str(column).strip().lower()
+        lookup.setdefault(key, column)
+    resolved = {}
+    for feature in features:
+        column = lookup.get(feature.lower(), lookup.get(feature.lower() + SCALED_SUFFIX))
+        if column is None:
+            raise ValueError(f"Missing PSI feature column: {feature}")
+        resolved[feature] = column
+    return resolved
+
+
+def needs_range(column):
+    """Columns suffixed ``_scaled`` are already in [0, 1]"""
+    return not str(column).lower().endswith(SCALED_SUFFIX)
+
+
+def compute_psi(df, config, columns=None):
+    """Vectorized PSI for every row of ``df``; rows with missing inputs get NaN"""
+    weights = config['weights']
+    ranges = config.get('ranges') or {}
+    columns = columns or resolve_columns(df.columns, weights)
+    total = np.zeros(len(df), dtype=np.float64)
+    for feature, weight in weights.items():
+        values = df[columns[feature]].to_numpy(dtype=np.float64)
+        if feature in ranges:
+            low, high = ranges[feature]
+            span = (high - low) or 1.0
+            values = np.clip((values - low) / span, 0.0, 1.0)
+        total += weight * values
+    return total / sum(weights.values())
+
+
+def psi_levels(psi, config):
+    """Bin PSI values into level names; NaN PSI maps to an empty level"""
+    levels = np.asarray(config['levels'] + [''], dtype=object)
+    idx = np.searchsorted(np.asarray(config['bin_edges'], dtype=np.float64), psi, side='right')
+    idx[np.isnan(psi)] = len(config['levels'])
+    return levels[idx]
+
+
+def label_dataframe(df, config):
+    """Return a copy of ``df`` with ``PSI`` and ``PSI_Level`` columns"""
+    config = dict(config)
+    columns = resolve_columns(df.columns, config['weights'])
+    ranges = dict(config.get('ranges') or {})
+    for feature, column in columns.items():
+        if feature not in ranges and needs_range(column):
+            ranges[feature] = (float(df[column].min()), float(df[column].max()))
+    config['ranges'] = ranges
+    psi = compute_psi(df, config, columns)
+    out = df.copy()
+    out['PSI'] = psi
+    out['PSI_Level'] = psi_levels(psi, config)
+    return out
+
+
+def split_byte_ranges(path, chunk_bytes=CHUNK_BYTES):
+    """Header line plus ``(start, end)`` byte ranges that end on newlines"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = f.tell()
+        ranges = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    return header, names, ranges
+
+
+def level_counts(levels, config):
+    """Counts per configured level, with unlabelled rows last"""
+    codes = pd.Categorical(levels, categories=config['levels'] + ['']).codes
+    return np.bincount(codes, minlength=len(config['levels']) + 1)
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _range_minmax(args):
+    path, start, end, names, usecols = args
+    df = pd.read_csv(io.BytesIO(_read_range(path, start, end)), header=None, names=names, usecols=usecols)
+    return {column: (float(df[column].min()), float(df[column].max())) for column in usecols}
+
+
+def _score_csv_range(args):
+    path, index, start, end, names, columns, config, part_dir, only_psi = args
+    buf = _read_range(path, start, end)
+    usecols = sorted(set(columns.values()))
+    df = pd.read_csv(io.BytesIO(buf), header=None, names=names, usecols=usecols)
+    psi = compute_psi(df, config, columns)
+    levels = psi_levels(psi, config)
+
+    suffix = pd.DataFrame({'PSI': psi, 'PSI_Level': levels}).to_csv(
+        header=False, index=False, float_format='%.6f'
+    ).encode().splitlines()
+    part_path = os.path.join(part_dir, f'part-{index:06d}.csv')
+    with open(part_path, 'wb') as out:
+        if only_psi:
+            out.writelines(extra + b'\n' for extra in suffix)
+        else:
+            lines = [line for line in buf.splitlines() if line.strip()]
+            if len(lines) != len(df):
+                raise ValueError(f"Byte range {start}-{end} has quoted newlines; cannot append PSI in place")
+            out.writelines(line + b',' + extra + b'\n' for line, extra in zip(lines, suffix))
+    return part_path, len(df), level_counts(levels, config)
+
+
+def _score_parquet_group(args):
+    path, index, group, columns, config, part_dir, only_psi = args
+    import pyarrow.parquet as pq
+    df = pq.ParquetFile(path).read_row_group(group).to_pandas()
+    psi = compute_psi(df, config, columns)
+    levels = psi_levels(psi, config)
+    out = pd.DataFrame({'PSI': psi, 'PSI_Level': levels}) if only_psi else df.assign(PSI=psi, PSI_Level=levels)
+    part_path = os.path.join(part_dir, f'part-{index:06d}.parquet')
+    out.to_parquet(part_path, index=False)
+    return part_path, len(df), level_counts(levels, config)
+
+
+def label_file(input_path, output_path, config, workers=None, chunk_bytes=CHUNK_BYTES, only_psi=False):
+    """Label a CSV or Parquet file of any size using all cores
+
+    Returns a summary with row count, level counts and throughput.
+    """
+    started = time.time()
+    workers = workers or os.cpu_count()
+    config = dict(config)
+    ranges = dict(config.get('ranges') or {})
+    part_dir = tempfile.mkdtemp(prefix='psi-', dir=os.path.dirname(os.path.abspath(output_path)))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if input_path.endswith('.parquet'):
+                import pyarrow.parquet as pq
+                parquet = pq.ParquetFile(input_path)
+                columns = resolve_columns(parquet.schema.names, config['weights'])
+                missing = [f for f, c in columns.items() if f not in ranges and needs_range(c)]
+                if missing:
+                    table = pq.read_table(input_path, columns=[columns[f] for f in missing])
+                    for feature in missing:
+                        values = table.column(columns[feature]).to_numpy()
+                        ranges[feature] = (float(np.nanmin(values)), float(np.nanmax(values)))
+                config['ranges'] = ranges
+                tasks = [(input_path, i, i, columns, config, part_dir, only_psi)
+                         for i in range(parquet.num_row_groups)]
+                results = list(pool.map(_score_parquet_group, tasks))
+            else:
+                header, names, byte_ranges = split_byte_ranges(input_path, chunk_bytes)
+                columns = resolve_columns(names, config['weights'])
+                missing = [f for f, c in columns.items() if f not in ranges and needs_range(c)]
+                if missing:
+                    # First pass: global min/max of unscaled columns
+                    usecols = [columns[f] for f in missing]
+                    minmax = list(pool.map(_range_minmax, [(input_path, s, e, names, usecols) for s, e in byte_ranges]))
+                    for feature in missing:
+                        column = columns[feature]
+                        ranges[feature] = (min(m[column][0] for m in minmax), max(m[column][1] for m in minmax))
+                config['ranges'] = ranges
+                tasks = [(input_path, i, s, e, names, columns, config, part_dir, only_psi)
+                         for i, (s, e) in enumerate(byte_ranges)]
+                results = list(pool.map(_score_csv_range, tasks))
+
+        if input_path.endswith('.parquet'):
+            if os.path.exists(output_path):
+                shutil.rmtree(output_path)
+            os.rename(part_dir, output_path)
+        else:
+            with open(output_path, 'wb') as out:
+                out.write(b'PSI,PSI_Level\n' if only_psi else header.rstrip(b'\r\n') + b',PSI,PSI_Level\n')
+                for part_path, _, _ in results:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, out, 16 * 1024 * 1024)
+    finally:
+        if os.path.isdir(part_dir):
+            shutil.rmtree(part_dir)
+
+    rows = sum(r[1] for r in results)
+    counts = np.sum([r[2] for r in results], axis=0) if results else np.zeros(len(config['levels']) + 1)
+    elapsed = time.time() - started
+    return {
+        'rows': int(rows),
+        'level_counts': {level: int(c) for level, c in zip(config['levels'], counts)},
+        'unlabelled_rows': int(counts[-1]),
+        'ranges': {f: list(r) for f, r in ranges.items()},
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Label water quality data with the Pollution Severity Index')
+    parser.add_argument('input', help='CSV or Parquet file to label')
+    parser.add_argument('output', help='Output CSV file, or Parquet directory for Parquet input')
+    parser.add_argument('--config', help='JSON file with weights, bin_edges, levels and ranges')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024), help='CSV bytes per task')
+    parser.add_argument('--only-psi', action='store_true', help='Write only PSI and PSI_Level columns')
+    args = parser.parse_args()
+
+    summary = label_file(args.input, args.output, load_config(args.config), workers=args.workers,
+                         chunk_bytes=args.chunk_mb * 1024 * 1024, only_psi=args.only_psi)
+    print(f"✅ Labelled {summary['rows']} rows in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second'] or 0:,.0f} rows/s)")
+    print(json.dumps(summary['level_counts'], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Fast JSON encoding, compression and pagination for dataset responses
+
+DataFrame and Series values are encoded by pandas' C JSON writer straight
+from their NumPy buffers and spliced into the response, so the large parts of
+dataset payloads never become Python dicts. NaN is written as ``null``.
+"""
+import base64
+import gzip
+import json
+
+import numpy as np
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+MAX_PAGE_ROWS = 1000
+
+
+class RawJSON(str):
+    """Already-encoded JSON that :func:`dataset_json` splices in verbatim"""
+
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(json.dumps({'offset': int(offset)}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Row offset stored in an opaque cursor; raises ValueError if malformed"""
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        offset = int(json.loads(base64.urlsafe_b64decode(padded.encode()))['offset'])
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
+
+
+def frame_json(df, layout='records'):
+    """Encode rows as a list of records or as ``{column: [values]}``"""
+    if layout == 'columns':
+        return '{' + ','.join(
+            json.dumps(str(column)) + ':' + df[column].to_json(orient='values', date_format='iso')
+            for column in df.columns
+        ) + '}'
+    return df.to_json(orient='records', date_format='iso')
+
+
+def page_json(df, cursor=None, limit=10, layout='records'):
+    """One page of rows plus the cursor for the next page (null on the last page)"""
+    offset = decode_cursor(cursor)
+    limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+    page = df.iloc[offset:offset + limit]
+    end = offset + len(page)
+    next_cursor = encode_cursor(end) if end < len(df) else None
+    return frame_json(page, layout), next_cursor, offset
+
+
+def dataset_json(df, cursor=None, limit=10, layout='records', extra=None):
+    """JSON text describing a dataset, with a paginated row sample"""
+    sample, next_cursor, offset = page_json(df, cursor, limit, layout)
+    numeric = df.select_dtypes(include=[np.number])
+    parts = {
+        'shape': json.dumps(list(df.shape)),
+        'columns': json.dumps([str(c) for c in df.columns]),
+        'sample': sample,
+        'sample_offset': json.dumps(offset),
+        'next_cursor': json.dumps(next_cursor),
+        'layout': json.dumps(layout),
+        'dtypes': df.dtypes.astype(str).to_json(),
+        'missing_values': df.isnull().sum().to_json(),
+        'description': numeric.describe().to_json() if len(numeric.columns) > 0 else '{}',
+    }
+    parts = {key: RawJSON(value) for key, value in parts.items()}
+    parts.update(extra or {})
+    return object_json(parts)
+
+
+def object_json(mapping):
+    """JSON object text; :class:`RawJSON` values are inserted without re-encoding"""
+    return '{' + ','.join(
+        json.dumps(str(key)) + ':' + (value if isinstance(value, RawJSON) else json.dumps(value))
+        for key, value in mapping.items()
+    ) + '}'
+
+
+def compressed_response(body, status=200, mimetype='application/json'):
+    """Response compressed with brotli or gzip when the client accepts it"""
+    data = body.encode('utf-8') if isinstance(body, str) else body
+    headers = {'Vary': 'Accept-Encoding'}
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        if brotli is not None and 'br' in accepted:
+            data = brotli.compress(data, quality=4)
+            headers['Content-Encoding'] = 'br'
+        elif 'gzip' in accepted:
+            data = gzip.compress(data, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+    return Response(data, status=status, mimetype=mimetype, headers=headers)
+
+
+def request_layout():
+    layout = request.args.get('layout', 'records')
+    if layout not in ('records', 'columns'):
+        raise ValueError("layout must be 'records' or 'columns'")
+    return layout
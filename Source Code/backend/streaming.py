@@ -0,0 +1,478 @@
+"""Stateful per-station streaming inference for the GRU model
+
+A station's readings must all step the same hidden state, wherever they
+are served. With a single server process the states live in an in-memory
+LRU and are snapshotted to ``STREAM_STATE_PATH``. With several gunicorn
+workers each would otherwise hold a different partial history of a
+station, so the states live in one SQLite table (``STREAM_STATE_DB``) that
+every worker reads and writes inside a transaction. Such states are
+already on disk, so a restart simply picks them up again.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+STREAM_STATE_TTL = float(os.environ.get('STREAM_STATE_TTL', 3600))
+STREAM_MAX_STATIONS = int(os.environ.get('STREAM_MAX_STATIONS', 10000))
+STREAM_STATE_PATH = os.environ.get('STREAM_STATE_PATH', os.path.join('..', 'stream_state.npz'))
+# 'memory' (one process only), 'sqlite' (shared by all workers) or 'auto' (sqlite when there are several workers)
+STREAM_STATE_STORE = os.environ.get('STREAM_STATE_STORE', 'auto')
+STREAM_STATE_DB = os.environ.get('STREAM_STATE_DB', os.path.join('..', 'stream_state.db'))
+INGEST_MAX_LINE_BYTES = int(os.environ.get('INGEST_MAX_LINE_BYTES', 64 * 1024))
+
+# Seconds between sweeps of idle and surplus stations from the shared table
+SHARED_SWEEP_SECONDS = 1.0
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': _sigmoid,
+    'hard_sigmoid': _hard_sigmoid,
+    'softmax': _softmax,
+}
+
+
+def _activation_name(fn):
+    name = getattr(fn, '__name__', str(fn))
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation for streaming: {name}")
+    return name
+
+
+class GRUStepper:
+    """NumPy re-implementation of the Keras GRU stack, one timestep at a time
+
+    Running the recurrence ourselves lets each station carry its hidden state
+    between requests, so a new reading costs a single recurrent step instead
+    of a full ``model.predict`` over a window of history.
+    """
+
+    def __init__(self, model):
+        self.layers = []
+        for layer in model.layers:
+            kind = layer.__class__.__name__
+            if kind == 'GRU':
+                kernel, recurrent_kernel, bias = layer.get_weights()
+                self.layers.append({
+                    'type': 'gru',
+                    'units': layer.units,
+                    'kernel': kernel.astype(np.float32),
+                    'recurrent_kernel': recurrent_kernel.astype(np.float32),
+                    'bias': bias.astype(np.float32),
+                    'reset_after': getattr(layer, 'reset_after', False),
+                    'activation': ACTIVATIONS[_activation_name(layer.activation)],
+                    'recurrent_activation': ACTIVATIONS[_activation_name(layer.recurrent_activation)],
+                })
+            elif kind == 'Dense':
+                kernel, bias = layer.get_weights()
+                self.layers.append({
+                    'type': 'dense',
+                    'kernel': kernel.astype(np.float32),
+                    'bias': bias.astype(np.float32),
+                    'activation': ACTIVATIONS[_activation_name(layer.activation)],
+                })
+            elif kind in ('Dropout', 'InputLayer'):
+                continue
+            else:
+                raise ValueError(f"Unsupported layer for streaming: {kind}")
+        self.state_sizes = [layer['units'] for layer in self.layers if layer['type'] == 'gru']
+        # Identifies the weights, so a state stepped by one model is never continued by another
+        digest = hashlib.blake2b(digest_size=8)
+        for layer in self.layers:
+            for key in ('kernel', 'recurrent_kernel', 'bias'):
+                if key in layer:
+                    digest.update(layer[key].tobytes())
+        self.signature = digest.hexdigest()
+
+    def initial_state(self, batch_size=1):
+        return [np.zeros((batch_size, units), dtype=np.float32) for units in self.state_sizes]
+
+    def _gru_step(self, layer, x, h):
+        units = layer['units']
+        kernel, recurrent_kernel, bias = layer['kernel'], layer['recurrent_kernel'], layer['bias']
+        if layer['reset_after']:
+            input_bias, recurrent_bias = bias[0], bias[1]
+        else:
+            input_bias, recurrent_bias = bias, None
+
+        x_gates = x @ kernel + input_bias
+        x_z, x_r, x_h = x_gates[:, :units], x_gates[:, units:2 * units], x_gates[:, 2 * units:]
+
+        if layer['reset_after']:
+            h_gates = h @ recurrent_kernel + recurrent_bias
+            h_z, h_r, h_h = h_gates[:, :units], h_gates[:, units:2 * units], h_gates[:, 2 * units:]
+            z = layer['recurrent_activation'](x_z + h_z)
+            r = layer['recurrent_activation'](x_r + h_r)
+            candidate = layer['activation'](x_h + r * h_h)
+        else:
+            h_zr = h @ recurrent_kernel[:, :2 * units]
+            z = layer['recurrent_activation'](x_z + h_zr[:, :units])
+            r = layer['recurrent_activation'](x_r + h_zr[:, units:])
+            candidate = layer['activation'](x_h + (r * h) @ recurrent_kernel[:, 2 * units:])
+
+        return z * h + (1.0 - z) * candidate
+
+    def step(self, x, states):
+        """Advance every row of ``x`` (n, features) by one timestep"""
+        out = np.asarray(x, dtype=np.float32)
+        new_states = []
+        i = 0
+        for layer in self.layers:
+            if layer['type'] == 'gru':
+                out = self._gru_step(layer, out, states[i])
+                new_states.append(out)
+                i += 1
+            else:
+                out = layer['activation'](out @ layer['kernel'] + layer['bias'])
+        return out, new_states
+
+
+class StationStateStore:
+    """LRU map of station id to GRU hidden state with idle eviction, private to one process"""
+
+    shared = False
+
+    def __init__(self, ttl=STREAM_STATE_TTL, max_stations=STREAM_MAX_STATIONS):
+        self.ttl = ttl
+        self.max_stations = max_stations
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, station_id):
+        entry = self._entries.get(station_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(station_id)
+        return entry
+
+    def put(self, station_id, states, now):
+        """Store the station's new state and return how many readings it has stepped"""
+        entry = self._entries.get(station_id)
+        steps = entry['steps'] + 1 if entry else 1
+        self._entries[station_id] = {'states': states, 'last_seen': now, 'steps': steps}
+        self._entries.move_to_end(station_id)
+        while len(self._entries) > self.max_stations:
+            self._entries.popitem(last=False)
+        return steps
+
+    def transaction(self):
+        # The predictor's lock already serializes every access within the process
+        return contextlib.nullcontext()
+
+    def rebind(self, stepper):
+        """Forget every state (they belong to the previous weights); returns how many were dropped"""
+        dropped = len(self._entries)
+        self._entries = OrderedDict()
+        return dropped
+
+    def remove(self, station_id):
+        return self._entries.pop(station_id, None) is not None
+
+    def evict_idle(self, now):
+        """Drop stations that have not reported within the TTL"""
+        evicted = 0
+        # Entries are kept in last-seen order, so stop at the first fresh one
+        while self._entries:
+            station_id, entry = next(iter(self._entries.items()))
+            if now - entry['last_seen'] <= self.ttl:
+                break
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def items(self):
+        return self._entries.items()
+
+
+class SharedStationStateStore:
+    """Station states in a SQLite table shared by every worker on the host
+
+    Each row records the signature of the weights that produced it; rows from
+    other weights, or idle past the TTL, read as a new station. Reads and
+    writes of one prediction happen in a single ``BEGIN IMMEDIATE``
+    transaction, so concurrent readings of a station from different workers
+    are stepped one after the other rather than from the same old state.
+    Callers serialize access within a process.
+    """
+
+    shared = True
+
+    def __init__(self, path=STREAM_STATE_DB, ttl=STREAM_STATE_TTL, max_stations=STREAM_MAX_STATIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_stations = max_stations
+        self.signature = None
+        self.state_sizes = []
+        self._conn = None
+        self._pid = None
+        self._last_sweep = 0.0
+
+    def _connection(self):
+        # One connection per process, opened after gunicorn forks the worker
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS stream_state ('
+                         'station_id TEXT PRIMARY KEY, model TEXT NOT NULL, states BLOB NOT NULL, '
+                         'last_seen REAL NOT NULL, steps INTEGER NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_stream_state_last_seen ON stream_state (last_seen)')
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM stream_state WHERE model = ? AND last_seen >= ?',
+            (self.signature, time.time() - self.ttl)).fetchone()[0]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get(self, station_id):
+        row = self._connection().execute(
+            'SELECT model, states, last_seen, steps FROM stream_state WHERE station_id = ?', (station_id,)).fetchone()
+        if row is None:
+            return None
+        model, blob, last_seen, steps = row
+        flat = np.frombuffer(blob, dtype=np.float32)
+        if model != self.signature or len(flat) != sum(self.state_sizes) or time.time() - last_seen > self.ttl:
+            return None
+        states = np.split(flat, np.cumsum(self.state_sizes)[:-1])
+        return {'states': states, 'last_seen': last_seen, 'steps': steps}
+
+    def put(self, station_id, states, now):
+        """Store the station's new state and return how many readings it has stepped"""
+        previous = self.get(station_id)
+        steps = previous['steps'] + 1 if previous else 1
+        blob = np.concatenate([np.asarray(s, dtype=np.float32).ravel() for s in states] or
+                              [np.zeros(0, dtype=np.float32)]).tobytes()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO stream_state (station_id, model, states, last_seen, steps) VALUES (?, ?, ?, ?, ?)',
+            (station_id, self.signature, blob, now, steps))
+        return steps
+
+    def remove(self, station_id):
+        cursor = self._connection().execute('DELETE FROM stream_state WHERE station_id = ?', (station_id,))
+        return cursor.rowcount > 0
+
+    def evict_idle(self, now):
+        """Drop idle stations and the least recently seen ones beyond ``max_stations``, at most once a second"""
+        if now - self._last_sweep < SHARED_SWEEP_SECONDS:
+            return 0
+        self._last_sweep = now
+        conn = self._connection()
+        evicted = conn.execute('DELETE FROM stream_state WHERE last_seen < ?', (now - self.ttl,)).rowcount
+        evicted += conn.execute(
+            'DELETE FROM stream_state WHERE station_id IN '
+            '(SELECT station_id FROM stream_state ORDER BY last_seen DESC LIMIT -1 OFFSET ?)',
+            (self.max_stations,)).rowcount
+        return evicted
+
+    def rebind(self, stepper):
+        """Read only states stepped by ``stepper``'s weights; returns how many rows no longer match"""
+        self.signature = stepper.signature
+        self.state_sizes = list(stepper.state_sizes)
+        total = self._connection().execute('SELECT COUNT(*) FROM stream_state').fetchone()[0]
+        return total - len(self)
+
+
+def create_state_store(mode=STREAM_STATE_STORE, workers=None):
+    """In-memory store for a single server process, the shared SQLite table otherwise
+
+    ``workers`` defaults to ``SERVER_WORKERS``, which gunicorn_config.py sets in
+    every worker; it is unset (one process) under ``python app.py``.
+    """
+    if workers is None:
+        workers = int(os.environ.get('SERVER_WORKERS', 1))
+    if mode not in ('auto', 'memory', 'sqlite'):
+        raise ValueError(f"Unknown STREAM_STATE_STORE: {mode}")
+    if mode == 'memory' and workers > 1:
+        raise ValueError(f"STREAM_STATE_STORE=memory keeps station state per process and {workers} workers "
+                         "are running; use sqlite (or auto) or WORKERS=1")
+    if mode == 'sqlite' or (mode == 'auto' and workers > 1):
+        return SharedStationStateStore()
+    return StationStateStore()
+
+
+class StreamingPredictor:
+    """Scores readings per station while keeping GRU state server-side"""
+
+    def __init__(self, model, scaler=None, class_names=None, store=None):
+        self.stepper = GRUStepper(model)
+        self.scaler = scaler
+        self.class_names = [str(c) for c in class_names] if class_names is not None else None
+        self.store = store if store is not None else StationStateStore()
+        self.store.rebind(self.stepper)
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _scale(self, X):
+        if self.scaler is not None and hasattr(self.scaler, 'data_min_'):
+            return self.scaler.transform(X)
+        return X
+
+    def predict(self, station_ids, features, now=None):
+        """Advance each station by one reading and return class probabilities
+
+        ``station_ids`` must be unique within a call so each row advances a
+        distinct recurrent state.
+        """
+        now = time.time() if now is None else now
+        X = self._scale(np.asarray(features, dtype=float).reshape(len(station_ids), -1))
+
+        with self._lock, self.store.transaction():
+            self.evicted += self.store.evict_idle(now)
+            previous = [self.store.get(s) for s in station_ids]
+            states = []
+            for i, size in enumerate(self.stepper.state_sizes):
+                layer_state = np.zeros((len(station_ids), size), dtype=np.float32)
+                for row, entry in enumerate(previous):
+                    if entry is not None:
+                        layer_state[row] = entry['states'][i]
+                states.append(layer_state)
+
+            probabilities, new_states = self.stepper.step(X, states)
+
+            steps = [self.store.put(station_id, [s[row].copy() for s in new_states], now)
+                     for row, station_id in enumerate(station_ids)]
+
+        return probabilities, steps
+
+    def swap_model(self, model):
+        """Step with ``model`` from now on; hidden states from the old weights are dropped"""
+        stepper = GRUStepper(model)
+        with self._lock:
+            self.stepper = stepper
+            dropped = self.store.rebind(stepper)
+        return dropped
+
+    def reset(self, station_id):
+        with self._lock:
+            return self.store.remove(station_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active_stations': len(self.store),
+                'evicted_stations': self.evicted,
+                'ttl_seconds': self.store.ttl,
+                'max_stations': self.store.max_stations,
+                'store': 'sqlite' if self.store.shared else 'memory',
+                'worker_pid': os.getpid(),
+            }
+
+    def snapshot(self, path=STREAM_STATE_PATH):
+        """Write all station states to a compressed ``.npz`` file
+
+        The shared store is already on disk, so this only reports its size.
+        """
+        with self._lock:
+            if self.store.shared:
+                return len(self.store)
+            arrays = {}
+            for station_id, entry in self.store.items():
+                for i, state in enumerate(entry['states']):
+                    arrays[f'{station_id}::{i}'] = state
+                arrays[f'{station_id}::meta'] = np.array([entry['last_seen'], entry['steps']])
+            count = len(self.store)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return count
+
+    def _restorable(self, parts):
+        """Whether a snapshot entry has metadata and one state of the right size per GRU layer"""
+        meta = parts.get('meta')
+        if meta is None or np.shape(meta) != (2,):
+            return False
+        return all(str(i) in parts and np.shape(parts[str(i)]) == (size,)
+                   for i, size in enumerate(self.stepper.state_sizes))
+
+    def restore(self, path=STREAM_STATE_PATH):
+        """Load station states written by :meth:`snapshot`
+
+        Stations whose saved state does not match the current model's layer
+        sizes (e.g. a snapshot from a different model) are dropped. The shared
+        store needs no restore; its current stations are counted instead.
+        """
+        if self.store.shared:
+            with self._lock:
+                return len(self.store)
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            stations = {}
+            for key in data.files:
+                station_id, part = key.rsplit('::', 1)
+                stations.setdefault(station_id, {})[part] = data[key]
+        valid = {s: parts for s, parts in stations.items() if self._restorable(parts)}
+        if len(valid) < len(stations):
+            print(f"⚠️ Dropped streaming state for {len(stations) - len(valid)} stations that do not fit the model")
+        with self._lock:
+            for station_id, parts in sorted(valid.items(), key=lambda kv: kv[1]['meta'][0]):
+                states = [parts[str(i)].astype(np.float32) for i in range(len(self.stepper.state_sizes))]
+                last_seen, steps = parts['meta']
+                self.store._entries[station_id] = {
+                    'states': states, 'last_seen': float(last_seen), 'steps': int(steps)
+                }
+        return len(valid)
+
+
+def iter_ndjson(stream, max_line_bytes=INGEST_MAX_LINE_BYTES):
+    """Yield ``(line_number, record, error)`` for each line of an NDJSON stream
+
+    At most ``max_line_bytes`` are buffered per line; longer lines are drained
+    and reported as errors instead of growing the buffer.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes + 1)
+            yield line_number, None, f'Line exceeds {max_line_bytes} bytes'
+            continue
+
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
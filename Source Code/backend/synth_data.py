@@ -0,0 +1,232 @@
+"""Generate large synthetic datasets that look like the shipped one
+
+Fits a Gaussian copula per class: each numeric column's marginal is kept as
+its empirical quantile function, and the dependence between columns is the
+correlation of their normal scores. Sampling draws correlated normals,
+maps them through the normal CDF and each column's quantile function, then
+re-inserts missing values at the observed per-class rate. Class
+proportions, per-class ranges and skew, and feature correlations all follow
+the source data.
+
+Rows are produced in fixed-size chunks on worker processes, each seeded
+from ``(seed, chunk index)``, and written in order with a bounded number of
+chunks in flight. Output is reproducible for a given seed and memory stays
+flat however many rows are requested. ``--stations`` and ``--timestamps``
+add a round-robin ``station_id`` and a regular per-station ``timestamp``
+so the streaming endpoints can be replayed. Readings of one station are
+independent draws, with no temporal correlation.
+
+Usage:
+    python synth_data.py synthetic.parquet --rows 100000000 [--stations 500 --timestamps] [--workers 8]
+    python synth_data.py big.csv --rows 5000000 --dataset "../../Datasets/water quality dataset.csv" --target ""
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import DATASET_PATH, TARGET
+from pipeline import write_parquet
+
+CHUNK_ROWS = 100000
+QUANTILES = 512
+RIDGE = 1e-6
+
+_model = None
+
+
+def _cholesky(corr):
+    """Cholesky factor of a correlation matrix, clipping negative eigenvalues if it is not positive definite"""
+    try:
+        return np.linalg.cholesky(corr)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(corr)
+        fixed = vectors @ np.diag(np.clip(values, RIDGE, None)) @ vectors.T
+        scale = np.sqrt(np.diag(fixed))
+        return np.linalg.cholesky(fixed / np.outer(scale, scale))
+
+
+def fit_copula(df, target=TARGET, quantiles=QUANTILES):
+    """Per-class marginals, normal-score correlation and missing rates of the numeric columns"""
+    from scipy.special import ndtri
+
+    features = [c for c in df.columns if c != target and pd.api.types.is_numeric_dtype(df[c])]
+    labels = df[target].astype(str) if target else pd.Series('all', index=df.index)
+    probs = np.linspace(0, 1, quantiles)
+    classes = []
+    for name, group in df.groupby(labels, sort=True):
+        X = group[features].to_numpy(dtype=np.float64)
+        missing = np.isnan(X).mean(axis=0)
+        marginals = np.empty((len(features), quantiles))
+        scores = np.zeros_like(X)
+        for j in range(len(features)):
+            observed = ~np.isnan(X[:, j])
+            values = X[observed, j]
+            if len(values) == 0:
+                marginals[j] = 0.0
+                continue
+            marginals[j] = np.quantile(values, probs)
+            # Normal scores from mid-ranks; missing readings get the neutral score 0
+            ranks = pd.Series(values).rank(method='average').to_numpy()
+            scores[observed, j] = ndtri(ranks / (len(values) + 1))
+        corr = np.corrcoef(scores, rowvar=False) if len(X) > 1 else np.eye(len(features))
+        # Constant columns have no correlation; nan_to_num zeroes their rows, then the diagonal is restored
+        corr = np.nan_to_num(np.atleast_2d(corr))
+        np.fill_diagonal(corr, 1.0 + RIDGE)
+        classes.append({
+            'name': name,
+            'weight': len(group) / len(df),
+            'marginals': marginals,
+            'cholesky': _cholesky(corr),
+            'missing': missing,
+        })
+
+    # Columns holding only whole numbers (counts, codes) are rounded after sampling
+    integer = [bool(np.all(np.mod(df[c].dropna(), 1) == 0)) for c in features]
+    return {'features': features, 'target': target, 'probs': probs, 'integer': np.array(integer),
+            'classes': classes}
+
+
+def sample(model, rows, rng):
+    """``rows`` synthetic rows as a DataFrame, class column last"""
+    from scipy.special import ndtr
+
+    features = model['features']
+    weights = np.array([c['weight'] for c in model['classes']])
+    counts = rng.multinomial(rows, weights / weights.sum())
+    X = np.empty((rows, len(features)))
+    labels = np.empty(rows, dtype=object)
+    start = 0
+    for spec, n in zip(model['classes'], counts):
+        if n == 0:
+            continue
+        u = ndtr(rng.standard_normal((n, len(features))) @ spec['cholesky'].T)
+        block = X[start:start + n]
+        for j in range(len(features)):
+            block[:, j] = np.interp(u[:, j], model['probs'], spec['marginals'][j])
+        block[rng.random(block.shape) < spec['missing']] = np.nan
+        labels[start:start + n] = spec['name']
+        start += n
+
+    # Classes were drawn as blocks; shuffle so they interleave like real data
+    order = rng.permutation(rows)
+    X, labels = X[order], labels[order]
+    X[:, model['integer']] = np.round(X[:, model['integer']])
+    df = pd.DataFrame(X, columns=features)
+    if model['target']:
+        df[model['target']] = labels
+    return df
+
+
+def _init_worker(model):
+    global _model
+    _model = model
+
+
+def _generate_chunk(args):
+    index, offset, rows, seed, options = args
+    df = sample(_model, rows, np.random.default_rng([seed, index]))
+    if options['stations']:
+        position = np.arange(offset, offset + rows)
+        station = position % options['stations']
+        df.insert(0, 'station_id', [f'ST{s:05d}' for s in station])
+        if options['timestamps']:
+            seconds = options['start'] + (position // options['stations']) * options['interval']
+            df.insert(1, 'timestamp', pd.to_datetime(seconds, unit='s'))
+    if not options['label'] and _model['target']:
+        df = df.drop(columns=[_model['target']])
+    if options['format'] == 'csv':
+        # Formatting text is the slow part of CSV output, so it happens on the workers
+        return rows, df.to_csv(index=False, header=index == 0, float_format='%.6g').encode()
+    return rows, df
+
+
+def generate(output_path, rows, model, workers=None, chunk_rows=CHUNK_ROWS, seed=42, stations=0,
+             timestamps=False, start='2024-01-01', interval=60, label=True, progress=True):
+    """Write ``rows`` synthetic rows to ``output_path`` (CSV, or Parquet by extension)"""
+    workers = workers or os.cpu_count()
+    options = {
+        'stations': stations,
+        'timestamps': timestamps,
+        'start': pd.Timestamp(start).value // 10 ** 9,
+        'interval': interval,
+        'label': label,
+        'format': 'parquet' if output_path.endswith('.parquet') else 'csv',
+    }
+    tasks = ((i, offset, min(chunk_rows, rows - offset), seed, options)
+             for i, offset in enumerate(range(0, rows, chunk_rows)))
+    started = time.time()
+    written = 0
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(model,)) as pool:
+
+        def results():
+            # Bounded look-ahead keeps memory flat and output in chunk order
+            nonlocal written
+            in_flight = deque()
+
+            def collect():
+                nonlocal written
+                n, data = in_flight.popleft().result()
+                written += n
+                if progress:
+                    print(f"⏳ {written:,}/{rows:,} rows ({written / (time.time() - started):,.0f} rows/s)",
+                          flush=True)
+                return data
+
+            for task in tasks:
+                in_flight.append(pool.submit(_generate_chunk, task))
+                if len(in_flight) >= workers * 2:
+                    yield collect()
+            while in_flight:
+                yield collect()
+
+        if options['format'] == 'parquet':
+            write_parquet(results(), output_path)
+        else:
+            with open(output_path, 'wb') as f:
+                for data in results():
+                    f.write(data)
+
+    seconds = time.time() - started
+    return {'rows': written, 'seconds': seconds, 'rows_per_second': written / seconds if seconds > 0 else None,
+            'workers': workers, 'bytes': os.path.getsize(output_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a large synthetic water quality dataset')
+    parser.add_argument('output', help='Output CSV or Parquet file (chosen by extension)')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dataset', default=DATASET_PATH, help='CSV to fit the distributions on')
+    parser.add_argument('--target', default=TARGET, help='Class column to fit per class ("" for none)')
+    parser.add_argument('--no-label', action='store_true', help='Leave the class column out of the output')
+    parser.add_argument('--stations', type=int, default=0, help='Add a station_id column with this many stations')
+    parser.add_argument('--timestamps', action='store_true', help='Add per-station timestamps (needs --stations)')
+    parser.add_argument('--start', default='2024-01-01', help='First timestamp')
+    parser.add_argument('--interval', type=int, default=60, help='Seconds between readings of one station')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Rows per task and per row group')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quiet', action='store_true', help='Do not print progress per chunk')
+    args = parser.parse_args()
+    if args.timestamps and not args.stations:
+        parser.error('--timestamps needs --stations')
+
+    model = fit_copula(pd.read_csv(args.dataset), args.target or None)
+    print(f"✅ Fitted {len(model['classes'])} classes over {len(model['features'])} columns from {args.dataset}")
+    summary = generate(args.output, args.rows, model, workers=args.workers, chunk_rows=args.chunk_rows,
+                       seed=args.seed, stations=args.stations, timestamps=args.timestamps, start=args.start,
+                       interval=args.interval, label=not args.no_label, progress=not args.quiet)
+    print(f"✅ Wrote {summary['rows']:,} rows ({summary['bytes'] / 1024 ** 2:,.1f} MB) to {args.output} in "
+          f"{summary['seconds']:.1f}s ({summary['rows_per_second'] or 0:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()